@@ -1,43 +1,77 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 from apis.session_router import router as session_router
 from apis.notes_router import router as notes_router
+from middleware.profiling import require_profile_admin
 
 router = APIRouter()
 
 router.include_router(session_router)
 router.include_router(notes_router)
 
+@router.get("/metrics", tags=["debug"], include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of this process's metrics"""
+    from middleware.metrics import render_metrics
+
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@router.get("/api/cache-stats", tags=["debug"])
+async def cache_stats():
+    """Hit, miss and eviction counters for the in-process caches, and how
+    many reads each single-flight group ran, coalesced or served cached"""
+    from middleware.auth_middleware import auth_cache_stats, user_flight
+    from apis.notes_router import list_flight, note_flight
+    from db.collection_version import version_flight
+
+    return {
+        "auth": auth_cache_stats(),
+        "single_flight": {
+            flight.name: flight.stats()
+            for flight in (user_flight, version_flight, list_flight, note_flight)
+        }
+    }
+
+@router.get("/api/profiles", tags=["debug"], dependencies=[Depends(require_profile_admin)])
+async def list_profiles():
+    """Captured request profiles in this process, newest first, without stacks"""
+    from utils.profiling import profile_store
+
+    return {"profiles": profile_store.summaries()}
+
+@router.get("/api/profiles/{profile_id}", tags=["debug"], dependencies=[Depends(require_profile_admin)])
+async def get_profile(profile_id: int):
+    """One profile; `stacks` maps collapsed stacks (root;...;leaf) to samples,
+    ready for flamegraph.pl or speedscope"""
+    from utils.profiling import profile_store
+
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return profile
+
 @router.get("/api/test-db", tags=["debug"])
 async def test_db():
-    """Test endpoint to verify database connection"""
-    from db.mongodb import get_db
+    """Readiness probe: a single ping to the database"""
+    from db.mongodb import Database, client_options
     
     try:
-        # Try to connect to the database
-        db = await get_db()
-        
-        # Get database stats to verify connection works
-        stats = await db.command("dbstats")
-        
-        # Try to list collections
-        collections = await db.list_collection_names()
-        
+        ping_ms = await Database.ping()
+        options = client_options()
         return {
             "status": "success",
             "message": "Database connection successful",
-            "db_name": db.name,
-            "collections": collections,
-            "stats": {
-                "collections": stats.get("collections", 0),
-                "objects": stats.get("objects", 0),
-                "storage_size_mb": round(stats.get("storageSize", 0) / (1024 * 1024), 2)
+            "ping_ms": round(ping_ms, 2),
+            "pool": {
+                "max_pool_size": options["maxPoolSize"],
+                "min_pool_size": options["minPoolSize"]
             }
         }
     except Exception as e:
-        import traceback
-        tb = traceback.format_exc()
-        return {
-            "status": "error",
-            "message": f"Database connection failed: {str(e)}",
-            "traceback": tb
-        }
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "error",
+                "message": f"Database connection failed: {str(e)}"
+            }
+        )
@@ -1,59 +1,677 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Request
-from models.note import NoteCreate, NoteUpdate, NoteResponse
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response, Query, Header
+from fastapi.responses import StreamingResponse
+from models.note import (
+    NoteCreate,
+    NoteUpdate,
+    NoteResponse,
+    BulkNoteRequest,
+    BulkNoteResponse,
+    BulkNoteResult,
+    NoteSearchResult,
+    NoteSearchResponse,
+    NoteChangesResponse,
+    NoteImportError,
+    NoteImportResponse
+)
+from models.user import AuthUser
+from pymongo import InsertOne, UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 from db.mongodb import Database
 from middleware.auth_middleware import get_user_from_token
+from middleware.rate_limit import limit_by_user
+from utils.pagination import (
+    MAX_PAGE_SIZE,
+    NOTES_SORT,
+    CHANGES_SORT,
+    cursor_for,
+    keyset_filter
+)
+from db.collection_version import get_notes_version, bump_notes_version
+from utils.etag import (
+    note_etag,
+    notes_list_etag,
+    etag_matches,
+    if_match_states,
+    state_filter
+)
+from utils.serialization import NOTE_PROJECTION, render_notes, render_ndjson
+from utils.cache import TTLCache
+from utils.single_flight import SingleFlight
+from utils.note_events import note_events
 from uuid import uuid4
+from datetime import datetime, timedelta
+import asyncio
+import json
+import os
+import re
 import time
-from typing import List
+import zlib
+from typing import List, Literal, Optional
+
+STREAM_BATCH_SIZE = 500
+MAX_BULK_OPERATIONS = 500
+TOMBSTONE_TTL_DAYS = int(os.getenv("NOTE_TOMBSTONE_TTL_DAYS", 30))
+# last_update is stamped before the write commits; the /changes watermark
+# trails the clock by this much so a slow write is not skipped
+CHANGES_WATERMARK_LAG = int(os.getenv("CHANGES_WATERMARK_LAG_SECONDS", 5))
+EVENTS_KEEPALIVE_SECONDS = 15
+LIST_CACHE_MAX_BODY = int(os.getenv("LIST_CACHE_MAX_BODY", 512 * 1024))
+IMPORT_BATCH_SIZE = int(os.getenv("NOTE_IMPORT_BATCH_SIZE", 500))
+MAX_IMPORT_LINE_BYTES = 64 * 1024
+MAX_IMPORT_ERRORS = 100
+
+# Rendered list bodies by list ETag, so repeat reads skip the notes query
+list_body_cache = TTLCache(
+    maxsize=int(os.getenv("LIST_CACHE_SIZE", 1000)),
+    ttl=float(os.getenv("LIST_CACHE_TTL", 300))
+)
+
+# Concurrent identical reads share one query and one serialization. List
+# flights are keyed by ETag, which changes with every write; note flights are
+# forgotten by each write to the note.
+list_flight = SingleFlight("notes_list")
+note_flight = SingleFlight("note", window=float(os.getenv("SINGLE_FLIGHT_WINDOW", 0)))
+
+# Deleted notes stay behind as tombstones (see _tombstone) so /changes can
+# report them; every other read and write must skip them.
+LIVE = {"deleted_at": None}
 
 router = APIRouter(
     prefix="/api/notes",
-    tags=["notes"]
+    tags=["notes"],
+    dependencies=[Depends(limit_by_user)]
 )
 
+def _new_note_document(note: NoteCreate, user: AuthUser) -> dict:
+    current_timestamp = int(time.time())
+    note_dict = note.dict()
+    note_dict.update({
+        "note_id": str(uuid4()),
+        "user_id": user.user_id,
+        "created_by": user.user_name,
+        # "user_email": user["user_email"],
+        "created_on": current_timestamp,
+        "last_update": current_timestamp,
+        "version": 1
+    })
+    return note_dict
+
+def _update_fields(note_update: NoteUpdate) -> dict:
+    """Fields sent in an update; null would erase a required field."""
+    update_data = note_update.dict(exclude_unset=True)
+    nulls = sorted(field for field, value in update_data.items() if value is None)
+    if nulls:
+        raise ValueError(f"Fields cannot be null: {', '.join(nulls)}")
+    return update_data
+
+def _tombstone(now: int) -> dict:
+    """Update that soft-deletes a note; the TTL index on purge_at removes it later."""
+    return {
+        "$set": {
+            "deleted_at": now,
+            "last_update": now,
+            "purge_at": datetime.utcfromtimestamp(now) + timedelta(days=TOMBSTONE_TTL_DAYS)
+        },
+        "$inc": {"version": 1}
+    }
+
 @router.post("/", response_model=NoteResponse)
 async def create_note(
     request: Request,
+    response: Response,
     note: NoteCreate,
     _=Depends(get_user_from_token)
 ):
     db = await Database.get_db()
-    print(note, request, "note")
     user = request.state.user
     
-    current_timestamp = int(time.time())
-    note_dict = note.dict()
-    note_dict.update({
-        "note_id": str(uuid4()),
-        "user_id": user["user_id"],
-        "created_by": user["user_name"],
-        # "user_email": user["user_email"],
-        "created_on": current_timestamp,
-        "last_update": current_timestamp
-    })
+    note_dict = _new_note_document(note, user)
     
     await db.notes.insert_one(note_dict)
+    await bump_notes_version(db, user.user_id)
+    note_events.publish_local(user.user_id, {"type": "created", "note": note_dict})
+    response.headers["ETag"] = note_etag(note_dict)
     return NoteResponse(**note_dict)
 
+async def _stream_notes(cursor, limit: Optional[int]):
+    """Yield notes as NDJSON lines straight from the Motor cursor.
+
+    When `limit` is set and more notes remain, a final
+    `{"next_cursor": ...}` line is emitted instead of the extra note.
+    """
+    sent = 0
+    async for note in cursor:
+        if limit is not None and sent == limit:
+            yield json.dumps({"next_cursor": cursor_for(last)}) + "\n"
+            break
+        yield NoteResponse(**note).json() + "\n"
+        last = note
+        sent += 1
+
 @router.get("/", response_model=List[NoteResponse])
 async def get_user_notes(
     request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    _=Depends(get_user_from_token)
+):
+    """List the user's notes.
+
+    Without `limit`/`cursor` every note is returned, as before. With them the
+    list is ordered by `(last_update, note_id)` descending and the cursor for
+    the next page is sent in the `X-Next-Cursor` header. `stream=true` sends
+    NDJSON with constant server memory. A matching `If-None-Match` gets 304
+    without reading any notes.
+    """
+    db = await Database.get_db()
+    user_id = request.state.user_id
+    etag = notes_list_etag(
+        user_id,
+        await get_notes_version(db, user_id),
+        request.url.query
+    )
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    paginated = limit is not None or cursor is not None
+    query = keyset_filter({"user_id": user_id, **LIVE}, cursor)
+
+    find = db.notes.find(query, NOTE_PROJECTION)
+    if paginated:
+        find = find.sort(NOTES_SORT)
+        if limit is not None:
+            find = find.limit(limit + 1)
+
+    if stream:
+        find = find.batch_size(STREAM_BATCH_SIZE)
+        return StreamingResponse(
+            _stream_notes(find, limit),
+            media_type="application/x-ndjson",
+            headers={"ETag": etag}
+        )
+
+    # The ETag changes with every write, so a cached body is never stale
+    cached = list_body_cache.get(etag)
+    if cached is None:
+        cached = await list_flight.do(etag, lambda: _render_list(find, limit, etag))
+    body, headers = cached
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def _render_list(find, limit: Optional[int], etag: str):
+    """Run the list query once and cache the rendered (body, headers)."""
+    headers = {"ETag": etag}
+    notes = await find.to_list(None)
+    if limit is not None and len(notes) > limit:
+        notes = notes[:limit]
+        headers["X-Next-Cursor"] = cursor_for(notes[-1])
+    body = render_notes(notes)
+    if len(body) <= LIST_CACHE_MAX_BODY:
+        list_body_cache.set(etag, (body, headers))
+    return body, headers
+
+@router.post("/bulk", response_model=BulkNoteResponse)
+async def bulk_notes(
+    bulk: BulkNoteRequest,
+    request: Request,
+    _=Depends(get_user_from_token)
+):
+    """Apply a batch of create/update/delete operations with one bulk_write.
+
+    Notes targeted by updates and deletes are read first in a single query so
+    every operation gets its own result. With `ordered` the batch stops at the
+    first failure and later operations are reported as not executed (424).
+    """
+    if len(bulk.operations) > MAX_BULK_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_OPERATIONS} operations per request"
+        )
+
+    db = await Database.get_db()
+    user_id = request.state.user_id
+    user = request.state.user
+
+    target_ids = [op.note_id for op in bulk.operations if op.op != "create" and op.note_id]
+    existing = {}
+    if target_ids:
+        async for note in db.notes.find(
+            {"user_id": user_id, "note_id": {"$in": target_ids}, **LIVE},
+            NOTE_PROJECTION
+        ):
+            existing[note["note_id"]] = note
+
+    results = [None] * len(bulk.operations)
+    writes = []
+    write_index = []  # position in `writes` -> position in `bulk.operations`
+    now = int(time.time())
+
+    for index, operation in enumerate(bulk.operations):
+        result = BulkNoteResult(index=index, op=operation.op, status=status.HTTP_200_OK, note_id=operation.note_id)
+        results[index] = result
+        write = None
+        try:
+            if operation.op == "create":
+                note_dict = _new_note_document(NoteCreate(**operation.data.dict()), user)
+                note = NoteResponse(**note_dict)
+                write = InsertOne(note_dict)
+                result.status = status.HTTP_201_CREATED
+                result.note_id = note_dict["note_id"]
+                result.note = note
+            elif operation.note_id not in existing:
+                result.status = status.HTTP_404_NOT_FOUND
+                result.error = "Note not found"
+            elif operation.op == "update":
+                if operation.data is None:
+                    raise ValueError("update requires data")
+                update_data = _update_fields(operation.data)
+                update_data.update({"last_update": now, "updated_by": user.user_name})
+                previous = existing[operation.note_id]
+                merged = {**previous, **update_data, "version": previous.get("version", 0) + 1}
+                # Validate before queueing the write so a rejected op never persists
+                note = NoteResponse(**merged)
+                write = UpdateOne(
+                    {"note_id": operation.note_id, "user_id": user_id, **LIVE},
+                    {"$set": update_data, "$inc": {"version": 1}}
+                )
+                existing[operation.note_id] = merged
+                result.note = note
+            else:
+                write = UpdateOne(
+                    {"note_id": operation.note_id, "user_id": user_id, **LIVE},
+                    _tombstone(now)
+                )
+                del existing[operation.note_id]
+                result.status = status.HTTP_204_NO_CONTENT
+        except Exception as e:
+            # Missing or invalid data for a create/update
+            result.status = status.HTTP_422_UNPROCESSABLE_ENTITY
+            result.error = str(e)
+            result.note = None
+            write = None
+
+        if result.status >= 400:
+            if bulk.ordered:
+                break
+        elif write is not None:
+            # Appended together so bulk_write error indexes map back correctly
+            writes.append(write)
+            write_index.append(index)
+
+    failed_writes = {}
+    if writes:
+        try:
+            await db.notes.bulk_write(writes, ordered=bulk.ordered)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed_writes[error["index"]] = error.get("errmsg", "Write failed")
+        for index in write_index:
+            note_flight.forget((user_id, bulk.operations[index].note_id))
+        if len(failed_writes) < len(writes):
+            await bump_notes_version(db, user_id)
+
+    first_failure = None
+    for position, index in enumerate(write_index):
+        if position in failed_writes:
+            results[index].status = status.HTTP_409_CONFLICT
+            results[index].note = None
+            results[index].error = failed_writes[position]
+            if first_failure is None:
+                first_failure = position
+        elif bulk.ordered and first_failure is not None:
+            results[index].status = status.HTTP_424_FAILED_DEPENDENCY
+            results[index].note = None
+            results[index].error = "Not executed: an earlier operation failed"
+
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = BulkNoteResult(
+                index=index,
+                op=bulk.operations[index].op,
+                note_id=bulk.operations[index].note_id,
+                status=status.HTTP_424_FAILED_DEPENDENCY,
+                error="Not executed: an earlier operation failed"
+            )
+
+    for result in results:
+        if result.status == status.HTTP_204_NO_CONTENT:
+            note_events.publish_local(user_id, {"type": "deleted", "note_id": result.note_id})
+        elif result.status < 400:
+            event_type = "created" if result.op == "create" else "updated"
+            note_events.publish_local(user_id, {"type": event_type, "note": result.note.dict()})
+
+    return BulkNoteResponse(ordered=bulk.ordered, results=results)
+
+def _range_filter(start: Optional[int], end: Optional[int]) -> Optional[dict]:
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lte"] = end
+    return bounds or None
+
+@router.get("/search", response_model=NoteSearchResponse)
+async def search_notes(
+    request: Request,
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    mode: Literal["text", "prefix"] = "text",
+    color: Optional[str] = None,
+    created_from: Optional[int] = None,
+    created_to: Optional[int] = None,
+    updated_from: Optional[int] = None,
+    updated_to: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    _=Depends(get_user_from_token)
+):
+    """Search the user's notes on the server.
+
+    `mode=text` runs `q` against the text index on title and content and
+    ranks by relevance. `mode=prefix` matches titles starting with `q`.
+    Results without `q`, and prefix results, are ordered newest first.
+    """
+    db = await Database.get_db()
+    user_id = request.state.user_id
+
+    query = {"user_id": user_id, **LIVE}
+    if color is not None:
+        query["color"] = color
+    created = _range_filter(created_from, created_to)
+    if created:
+        query["created_on"] = created
+    updated = _range_filter(updated_from, updated_to)
+    if updated:
+        query["last_update"] = updated
+
+    projection = NOTE_PROJECTION
+    sort = NOTES_SORT
+    if q and mode == "text":
+        query["$text"] = {"$search": q}
+        projection = {**NOTE_PROJECTION, "score": {"$meta": "textScore"}}
+        sort = [("score", {"$meta": "textScore"})] + NOTES_SORT
+    elif q:
+        query["note_title"] = {"$regex": "^" + re.escape(q), "$options": "i"}
+
+    notes = await (
+        db.notes.find(query, projection)
+        .sort(sort)
+        .skip(offset)
+        .limit(limit + 1)
+        .to_list(None)
+    )
+    next_offset = None
+    if len(notes) > limit:
+        notes = notes[:limit]
+        next_offset = offset + limit
+    return NoteSearchResponse(
+        results=[NoteSearchResult(**note) for note in notes],
+        next_offset=next_offset
+    )
+
+def _sse(event: dict) -> str:
+    if "note" in event:
+        data = NoteResponse(**event["note"]).json()
+    elif "note_id" in event:
+        data = json.dumps({"note_id": event["note_id"]})
+    else:
+        data = "{}"
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+async def _event_stream(request: Request, user_id: str):
+    queue = note_events.subscribe(user_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse(event)
+            if event["type"] == "resync":
+                # The broker dropped this subscriber for falling behind
+                break
+    finally:
+        note_events.unsubscribe(user_id, queue)
+
+@router.get("/events")
+async def note_event_stream(
+    request: Request,
+    _=Depends(get_user_from_token)
+):
+    """Server-Sent Events for the user's note changes.
+
+    Events are `created` and `updated` (the note), `deleted` (its note_id),
+    and `resync`, sent when the client should refetch the list.
+    """
+    note_events.ensure_started(await Database.get_db())
+    return StreamingResponse(
+        _event_stream(request, request.state.user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/changes", response_model=NoteChangesResponse)
+async def get_note_changes(
+    request: Request,
+    since: int = Query(..., ge=0),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     _=Depends(get_user_from_token)
 ):
+    """Notes created, updated or deleted at or after `since` (epoch seconds).
+
+    `last_update` has one-second resolution, so the range is inclusive: pass
+    the returned `watermark` as the next `since`, and expect to see changes
+    from that second again. When `next_cursor` is set, fetch the rest of this
+    batch with the same `since` and that cursor before moving on.
+
+    The watermark lags the clock by CHANGES_WATERMARK_LAG seconds, so writes
+    still committing when it was taken are reported next time. If `since`
+    is older than tombstone retention, `full_resync` is set: purged
+    deletions cannot be reported, so the client should rebuild from the
+    notes returned rather than merge them.
+    """
     db = await Database.get_db()
     user_id = request.state.user_id
-    notes = await db.notes.find({"user_id": user_id}).to_list(None)
-    return [NoteResponse(**note) for note in notes]
+    now = int(time.time())
+    watermark = now - CHANGES_WATERMARK_LAG
+    full_resync = since < now - TOMBSTONE_TTL_DAYS * 24 * 3600
+
+    query = keyset_filter(
+        {"user_id": user_id, "last_update": {"$gte": since}},
+        cursor,
+        descending=False
+    )
+    changes = await (
+        db.notes.find(query, {**NOTE_PROJECTION, "deleted_at": 1})
+        .sort(CHANGES_SORT)
+        .limit(limit + 1)
+        .to_list(None)
+    )
+    next_cursor = None
+    if len(changes) > limit:
+        changes = changes[:limit]
+        next_cursor = cursor_for(changes[-1])
+
+    return NoteChangesResponse(
+        notes=[NoteResponse(**note) for note in changes if note.get("deleted_at") is None],
+        deleted=[note["note_id"] for note in changes if note.get("deleted_at") is not None],
+        watermark=watermark,
+        next_cursor=next_cursor,
+        full_resync=full_resync
+    )
+
+async def _export_ndjson(cursor, compress: bool):
+    """Yield the cursor's notes as NDJSON, one chunk per fetched batch.
+
+    With `compress` the chunks are gzip members of one file, so memory stays
+    bounded by a batch either way.
+    """
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    batch = []
+    async for note in cursor:
+        batch.append(note)
+        if len(batch) < STREAM_BATCH_SIZE:
+            continue
+        chunk = render_ndjson(batch)
+        batch = []
+        if gzip is not None:
+            chunk = gzip.compress(chunk)
+        if chunk:
+            yield chunk
+    chunk = render_ndjson(batch) if batch else b""
+    if gzip is not None:
+        chunk = gzip.compress(chunk) + gzip.flush()
+    if chunk:
+        yield chunk
+
+@router.get("/export")
+async def export_notes(
+    request: Request,
+    compress: bool = Query(False, alias="gzip"),
+    _=Depends(get_user_from_token)
+):
+    """Download every note as NDJSON (`gzip=true`: a gzipped file).
+
+    Notes are streamed from the cursor as they are read, newest first; the
+    output can be sent back unchanged to `/import`.
+    """
+    db = await Database.get_db()
+    find = (
+        db.notes.find({"user_id": request.state.user_id, **LIVE}, NOTE_PROJECTION)
+        .sort(NOTES_SORT)
+        .batch_size(STREAM_BATCH_SIZE)
+    )
+    filename = "notes.ndjson.gz" if compress else "notes.ndjson"
+    return StreamingResponse(
+        _export_ndjson(find, compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+async def _body_chunks(request: Request):
+    """The raw request body, gunzipped when sent with Content-Encoding: gzip.
+
+    Inflated output is capped per step, so a small compressed upload cannot
+    expand into one huge chunk.
+    """
+    gunzip = None
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        gunzip = zlib.decompressobj(31)
+    async for chunk in request.stream():
+        if gunzip is None:
+            yield chunk
+            continue
+        while chunk:
+            yield gunzip.decompress(chunk, MAX_IMPORT_LINE_BYTES)
+            chunk = gunzip.unconsumed_tail
+    if gunzip is not None:
+        yield gunzip.flush()
+
+async def _ndjson_lines(request: Request):
+    """Yield (line number, line) pairs as the body arrives; blank lines are skipped."""
+    buffer = b""
+    number = 0
+    async for chunk in _body_chunks(request):
+        buffer += chunk
+        if b"\n" not in chunk:
+            if len(buffer) > MAX_IMPORT_LINE_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Line {number + 1} is longer than {MAX_IMPORT_LINE_BYTES} bytes"
+                )
+            continue
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+    if buffer.strip():
+        yield number + 1, buffer
+
+def _import_error(result: NoteImportResponse, line: int, error: str):
+    result.failed += 1
+    if len(result.errors) < MAX_IMPORT_ERRORS:
+        result.errors.append(NoteImportError(line=line, error=error))
+    else:
+        result.errors_truncated = True
+
+async def _insert_batch(db, user_id: str, batch: list, result: NoteImportResponse):
+    """Insert (line number, document) pairs; failures are reported by line."""
+    # Stamped at insert, not parse time, which can be long before on a slow upload
+    now = int(time.time())
+    for _, document in batch:
+        document["created_on"] = document["last_update"] = now
+    try:
+        await db.notes.insert_many([document for _, document in batch], ordered=False)
+        result.imported += len(batch)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        for error in write_errors:
+            _import_error(result, batch[error["index"]][0], error.get("errmsg", "Write failed"))
+        result.imported += len(batch) - len(write_errors)
+    await bump_notes_version(db, user_id)
+
+@router.post("/import", response_model=NoteImportResponse)
+async def import_notes(
+    request: Request,
+    _=Depends(get_user_from_token)
+):
+    """Create notes from an NDJSON upload, one `NoteCreate` object per line.
+
+    The body is parsed as it streams in (gzip with Content-Encoding: gzip)
+    and inserted in batches of IMPORT_BATCH_SIZE. Lines that fail to parse,
+    validate or insert are reported by line number and skipped; every other
+    line is imported. Each imported note gets a new note_id, so an export
+    can be imported into any account.
+    """
+    db = await Database.get_db()
+    user = request.state.user
+    result = NoteImportResponse(imported=0, failed=0, errors=[])
+    batch = []
+    try:
+        async for number, line in _ndjson_lines(request):
+            try:
+                note = NoteCreate(**json.loads(line))
+            except (ValueError, TypeError) as e:
+                # Invalid JSON, a non-object line, or a failed validation
+                _import_error(result, number, str(e))
+                continue
+            batch.append((number, _new_note_document(note, user)))
+            if len(batch) == IMPORT_BATCH_SIZE:
+                await _insert_batch(db, user.user_id, batch, result)
+                batch = []
+        if batch:
+            await _insert_batch(db, user.user_id, batch, result)
+    except zlib.error as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid gzip body: {str(e)}"
+        )
+    finally:
+        # Batches inserted before a failure stay imported
+        if result.imported:
+            # One refetch instead of an event per imported note
+            note_events.publish_local(user.user_id, {"type": "resync"})
+    return result
 
 @router.get("/{note_id}", response_model=NoteResponse)
 async def get_note(
     note_id: str,
     request: Request,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     _=Depends(get_user_from_token)
 ):
     db = await Database.get_db()
     user_id = request.state.user_id
-    note = await db.notes.find_one({"note_id": note_id, "user_id": user_id})
+    note = await note_flight.do(
+        (user_id, note_id),
+        lambda: db.notes.find_one({"note_id": note_id, "user_id": user_id, **LIVE}, NOTE_PROJECTION)
+    )
     
     if not note:
         raise HTTPException(
@@ -61,6 +679,10 @@ async def get_note(
             detail="Note not found"
         )
     
+    etag = note_etag(note)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return NoteResponse(**note)
 
 @router.put("/{note_id}", response_model=NoteResponse)
@@ -68,33 +690,61 @@ async def update_note(
     note_id: str,
     note_update: NoteUpdate,
     request: Request,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     _=Depends(get_user_from_token)
 ):
+    """Update a note in one round trip.
+
+    Send the note's ETag in `If-Match` to make the write conditional; a note
+    changed since that ETag was issued gets 412 instead of being overwritten.
+    """
     db = await Database.get_db()
     user_id = request.state.user_id
     user = request.state.user
-    
 
-    existing_note = await db.notes.find_one({"note_id": note_id, "user_id": user_id})
-    if not existing_note:
+    query = {"note_id": note_id, "user_id": user_id, **LIVE}
+    states = if_match_states(if_match, note_id)
+    if states is not None:
+        query.update(state_filter(states))
+
+    try:
+        update_data = _update_fields(note_update)
+    except ValueError as e:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Note not found"
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
         )
-    
-    update_data = note_update.dict(exclude_unset=True)
     update_data.update({
         "last_update": int(time.time()),
-        "updated_by": user["user_name"],
+        "updated_by": user.user_name,
         # "updated_by_email": user["user_email"]
     })
-    
-    await db.notes.update_one(
-        {"note_id": note_id, "user_id": user_id},
-        {"$set": update_data}
+
+    updated_note = await db.notes.find_one_and_update(
+        query,
+        {"$set": update_data, "$inc": {"version": 1}},
+        projection=NOTE_PROJECTION,
+        return_document=ReturnDocument.AFTER
     )
-    
-    updated_note = await db.notes.find_one({"note_id": note_id})
+    if not updated_note:
+        # Only a conditional write can miss for a note that exists
+        if states is not None and await db.notes.count_documents(
+            {"note_id": note_id, "user_id": user_id, **LIVE}, limit=1
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_412_PRECONDITION_FAILED,
+                detail="Note has been modified"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found"
+        )
+
+    note_flight.forget((user_id, note_id))
+    await bump_notes_version(db, user_id)
+    note_events.publish_local(user_id, {"type": "updated", "note": updated_note})
+    response.headers["ETag"] = note_etag(updated_note)
     return NoteResponse(**updated_note)
 
 @router.delete("/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -106,10 +756,17 @@ async def delete_note(
     db = await Database.get_db()
     user_id = request.state.user_id
     
-    result = await db.notes.delete_one({"note_id": note_id, "user_id": user_id})
+    result = await db.notes.update_one(
+        {"note_id": note_id, "user_id": user_id, **LIVE},
+        _tombstone(int(time.time()))
+    )
     
-    if result.deleted_count == 0:
+    if result.matched_count == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Note not found"
-        ) 
\ No newline at end of file
+        )
+
+    note_flight.forget((user_id, note_id))
+    await bump_notes_version(db, user_id)
+    note_events.publish_local(user_id, {"type": "deleted", "note_id": note_id})
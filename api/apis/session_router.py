@@ -5,21 +5,23 @@ from typing import Optional
 from models.user import UserCreate, UserResponse
 from pydantic import BaseModel
 from db.mongodb import Database
+from middleware.auth_middleware import invalidate_user, AUTH_USER_PROJECTION
+from middleware.rate_limit import limit_by_ip
 from utils.auth import (
-    verify_password,
-    get_password_hash,
     create_access_token,
+    create_refresh_token,
+    decode_refresh_token,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
+from utils.hashing import hasher
 from uuid import uuid4
 import time
 import logging
 
-logging.basicConfig(level=logging.INFO)
-
 router = APIRouter(
     prefix="/api/auth",
-    tags=["authentication"]
+    tags=["authentication"],
+    dependencies=[Depends(limit_by_ip)]
 )
 
 
@@ -59,7 +61,7 @@ router = APIRouter(
 @router.post("/signup", response_model=UserResponse)
 async def signup(user: UserCreate):
     # Log when the route is accessed
-    logging.info(f"Signup route accessed for: {user.user_email}")
+    logging.debug(f"Signup route accessed for: {user.user_email}")
     
     try:
         # Check for valid MongoDB connection
@@ -73,20 +75,20 @@ async def signup(user: UserCreate):
             )
         
         # Check if user already exists
-        logging.info(f"Checking if user {user.user_email} already exists")
-        existing_user = await db.users.find_one({"user_email": user.user_email})
+        logging.debug(f"Checking if user {user.user_email} already exists")
+        existing_user = await db.users.find_one({"user_email": user.user_email}, {"_id": 1})
         if existing_user:
-            logging.info(f"User {user.user_email} already exists")
+            logging.debug(f"User {user.user_email} already exists")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
         
         # Create new user
-        logging.info(f"Creating new user: {user.user_email}")
+        logging.debug(f"Creating new user: {user.user_email}")
         current_timestamp = int(time.time())
         user_dict = user.dict()
-        user_dict["password"] = get_password_hash(user.password)
+        user_dict["password"] = await hasher.hash(user.password)
         user_dict["user_id"] = str(uuid4())
         user_dict["create_on"] = current_timestamp
         user_dict["last_update"] = current_timestamp
@@ -94,7 +96,8 @@ async def signup(user: UserCreate):
         # Insert user with more logging
         try:
             result = await db.users.insert_one(user_dict)
-            logging.info(f"User created with ID: {result.inserted_id}")
+            invalidate_user(user_dict["user_id"])
+            logging.debug(f"User created with ID: {result.inserted_id}")
         except Exception as e:
             logging.error(f"Failed to insert user into database: {str(e)}")
             raise HTTPException(
@@ -113,32 +116,78 @@ async def signup(user: UserCreate):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Could not create user: {str(e)}"
         )
+# What login needs: the hash to verify plus the UserResponse fields
+LOGIN_PROJECTION = {
+    "_id": 0,
+    "password": 1,
+    "user_id": 1,
+    "user_name": 1,
+    "user_email": 1,
+    "create_on": 1,
+    "last_update": 1
+}
+
+def _issue_tokens(user_id: str, user_name: str) -> dict:
+    access_token = create_access_token(
+        data={"user_id": user_id, "user_name": user_name},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {
+        "access_token": access_token,
+        "refresh_token": create_refresh_token(user_id),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
 class LoginRequest(BaseModel):
     email: str
     password: str
 
 @router.post("/login")
 async def login(request: LoginRequest):
-    print(request.email, request.password,"sdfdfas")
-    logging.info("login route accessed!",request)
+    logging.debug(f"Login attempt for: {request.email}")
     db = await Database.get_db()
-    user = await db.users.find_one({"user_email": request.email})
+    user = await db.users.find_one({"user_email": request.email}, LOGIN_PROJECTION)
     
-    if not user or not verify_password(request.password, user["password"]):
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
         )
-    
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    access_token = create_access_token(
-        data={"user_id": user["user_id"]},
-        expires_delta=access_token_expires
-    )
+    verified, new_hash = await hasher.verify_and_update(request.password, user["password"])
+    if not verified:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+        )
+
+    # The configured bcrypt cost changed since this hash was made
+    if new_hash:
+        await db.users.update_one(
+            {"user_id": user["user_id"]},
+            {"$set": {"password": new_hash}}
+        )
+        invalidate_user(user["user_id"])
     
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **_issue_tokens(user["user_id"], user["user_name"]),
         "user": UserResponse(**user)
-    } 
\ No newline at end of file
+    }
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+@router.post("/refresh")
+async def refresh(request: RefreshRequest):
+    """Exchange a refresh token for a new access/refresh token pair"""
+    payload = decode_refresh_token(request.refresh_token)
+    db = await Database.get_db()
+    # Checked on every refresh so removed users cannot keep renewing tokens
+    user = await db.users.find_one({"user_id": payload["user_id"]}, AUTH_USER_PROJECTION)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
+    return _issue_tokens(user["user_id"], user["user_name"]) 
\ No newline at end of file
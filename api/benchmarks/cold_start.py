@@ -0,0 +1,140 @@
+"""Serverless cold start: process start to first response through index.handler.
+
+Run from the api directory:
+
+    python -m benchmarks.cold_start --runs 10
+    MONGODB_URL=mongodb://localhost:27017 python -m benchmarks.cold_start --path /api/notes/ --auth
+
+Each run is a fresh interpreter that imports `index` (the Mangum handler, as
+Vercel does), then sends it a synthetic API Gateway event and a second, warm
+one. `--auth` signs a token for a throwaway user, so the first request also
+pays for the deferred JWT import. Without MONGODB_URL the Motor prewarm is
+skipped. Output is one JSON object: percentiles across runs for each phase,
+plus the slowest packages from the child's import report.
+"""
+from uuid import uuid4
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Marks the result among the app's own stdout log lines
+RESULT_PREFIX = "cold-start-result: "
+
+def _event(path: str, headers: dict) -> dict:
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"host": "localhost", "accept": "application/json", **headers},
+        "requestContext": {
+            "http": {
+                "method": "GET",
+                "path": path,
+                "protocol": "HTTP/1.1",
+                "sourceIp": "127.0.0.1",
+                "userAgent": "cold-start-bench"
+            },
+            "requestId": str(uuid4()),
+            "stage": "$default",
+            "domainName": "localhost"
+        },
+        "isBase64Encoded": False,
+        "body": None
+    }
+
+def child(args):
+    """One cold start; prints a JSON line for the parent."""
+    start = time.perf_counter()
+    import index
+    imported = time.perf_counter()
+
+    headers = {}
+    if args.auth:
+        from datetime import timedelta
+        from utils.auth import create_access_token
+
+        token = create_access_token(
+            data={"user_id": str(uuid4()), "user_name": "cold-start"},
+            expires_delta=timedelta(minutes=5)
+        )
+        headers["authorization"] = f"Bearer {token}"
+
+    first_start = time.perf_counter()
+    response = index.handler(_event(args.path, headers), None)
+    first = time.perf_counter() - first_start
+    first_response_at = time.time()
+    warm_start = time.perf_counter()
+    index.handler(_event(args.path, headers), None)
+    warm = time.perf_counter() - warm_start
+
+    report = getattr(index, "startup_report", {})
+    # The log listener writes to stdout from its own thread; stop it first so
+    # no record lands inside the result line
+    from utils.log import stop_logging
+
+    stop_logging()
+    print(RESULT_PREFIX + json.dumps({
+        "status": response["statusCode"],
+        "first_response_at": first_response_at,
+        "init_ms": (imported - start) * 1000,
+        "prewarm_ms": report.get("prewarm_ms"),
+        "first_response_ms": first * 1000,
+        "warm_response_ms": warm * 1000,
+        "modules": report.get("modules", {})
+    }), flush=True)
+
+def _percentiles(values: list) -> dict:
+    if len(values) < 2:
+        values = values * 2
+    quantiles = statistics.quantiles(sorted(values), n=100)
+    return {"p50_ms": round(quantiles[49], 1), "p95_ms": round(quantiles[94], 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--auth", action="store_true", help="send a bearer token")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    env = {**os.environ, "ACCESS_LOG_SAMPLE_RATE": "0", "RATE_LIMIT_ENABLED": "false"}
+    if not env.get("MONGODB_URL"):
+        env["MONGODB_PREWARM"] = "false"
+    command = [sys.executable, "-m", "benchmarks.cold_start", "--child", "--path", args.path]
+    if args.auth:
+        command.append("--auth")
+
+    runs = []
+    for _ in range(args.runs):
+        spawned_at = time.time()
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        line = next(line for line in output.splitlines() if line.startswith(RESULT_PREFIX))
+        result = json.loads(line[len(RESULT_PREFIX):])
+        # Interpreter start included, as on a real cold start
+        result["process_to_response_ms"] = (result["first_response_at"] - spawned_at) * 1000
+        runs.append(result)
+
+    phases = ["process_to_response_ms", "init_ms", "first_response_ms", "warm_response_ms"]
+    summary = {
+        "path": args.path,
+        "runs": args.runs,
+        "statuses": sorted({run["status"] for run in runs}),
+        **{phase: _percentiles([run[phase] for run in runs]) for phase in phases},
+        "slowest_imports_ms": runs[-1]["modules"]
+    }
+    prewarm = [run["prewarm_ms"] for run in runs if run["prewarm_ms"] is not None]
+    if prewarm:
+        summary["prewarm_ms"] = _percentiles(prewarm)
+    print(json.dumps(summary))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Load test for the Notes API: throughput and p50/p95/p99 per scenario.
+
+Run from the api directory. Against an in-memory MongoDB stand-in:
+
+    python -m benchmarks.load_test --backend mongomock --users 50 --notes 200
+
+Against a local mongod. A fresh `notes_bench_<random>` database is seeded
+and dropped afterwards; the app's own database is never touched:
+
+    MONGODB_URL=mongodb://localhost:27017 python -m benchmarks.load_test --backend mongod
+
+The app runs in-process behind httpx's ASGI transport, so the numbers cover
+routing, auth, Mongo access and serialization but not the network stack.
+Each scenario prints one JSON line; --output also writes them all to a file.
+Needs the extra packages in benchmarks/requirements.txt.
+"""
+from datetime import timedelta
+from uuid import uuid4
+from benchmarks.stats import summarize
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+SCENARIOS = ["signup", "login", "list", "get", "create", "update", "delete"]
+PASSWORD = "load-test-password"
+COLORS = ["yellow", "pink", "blue", "green"]
+
+class LoadTest:
+    def __init__(self, client, db, users: int, notes_per_user: int, seed: int):
+        self.client = client
+        self.db = db
+        self.users = users
+        self.notes_per_user = notes_per_user
+        self.rng = random.Random(seed)
+        self.accounts = []  # (email, user_id, token)
+        self.note_ids = {}  # user_id -> [note_id]
+
+    async def seed(self):
+        from utils.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+        from utils.hashing import hasher
+
+        password_hash = await hasher.hash(PASSWORD)
+        now = int(time.time())
+        users = []
+        notes = []
+        for u in range(self.users):
+            user_id = str(uuid4())
+            email = f"load-{u}-{user_id[:8]}@example.com"
+            users.append({
+                "user_name": f"load-user-{u}",
+                "user_email": email,
+                "password": password_hash,
+                "user_id": user_id,
+                "create_on": now,
+                "last_update": now
+            })
+            token = create_access_token(
+                data={"user_id": user_id, "user_name": f"load-user-{u}"},
+                expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+            )
+            self.accounts.append((email, user_id, token))
+            self.note_ids[user_id] = []
+            for n in range(self.notes_per_user):
+                note_id = str(uuid4())
+                notes.append({
+                    "note_title": f"Note {n}",
+                    "note_content": f"Seeded content for note {n} of user {u}",
+                    "color": self.rng.choice(COLORS),
+                    "note_id": note_id,
+                    "user_id": user_id,
+                    "created_by": f"load-user-{u}",
+                    "created_on": now - n,
+                    "last_update": now - n,
+                    "version": 1
+                })
+                self.note_ids[user_id].append(note_id)
+        await self.db.users.insert_many(users)
+        for start in range(0, len(notes), 5000):
+            await self.db.notes.insert_many(notes[start:start + 5000])
+
+    def _account(self):
+        return self.rng.choice(self.accounts)
+
+    def _auth(self, token: str) -> dict:
+        return {"Authorization": f"Bearer {token}"}
+
+    def _note(self, user_id: str, pop: bool = False):
+        ids = self.note_ids[user_id]
+        if not ids:
+            return None
+        if pop:
+            return ids.pop(self.rng.randrange(len(ids)))
+        return self.rng.choice(ids)
+
+    async def signup(self):
+        suffix = uuid4().hex
+        return await self.client.post("/api/auth/signup", json={
+            "user_name": f"signup-{suffix[:8]}",
+            "user_email": f"signup-{suffix}@example.com",
+            "password": PASSWORD
+        })
+
+    async def login(self):
+        email, _, _ = self._account()
+        return await self.client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+
+    async def list(self):
+        _, _, token = self._account()
+        return await self.client.get("/api/notes/", headers=self._auth(token))
+
+    async def get(self):
+        _, user_id, token = self._account()
+        note_id = self._note(user_id) or "missing"
+        return await self.client.get(f"/api/notes/{note_id}", headers=self._auth(token))
+
+    async def create(self):
+        _, user_id, token = self._account()
+        response = await self.client.post("/api/notes/", headers=self._auth(token), json={
+            "note_title": "Load test note",
+            "note_content": "Created during the load test",
+            "color": self.rng.choice(COLORS)
+        })
+        if response.status_code < 400:
+            self.note_ids[user_id].append(response.json()["note_id"])
+        return response
+
+    async def update(self):
+        _, user_id, token = self._account()
+        note_id = self._note(user_id) or "missing"
+        return await self.client.put(
+            f"/api/notes/{note_id}",
+            headers=self._auth(token),
+            json={"color": self.rng.choice(COLORS)}
+        )
+
+    async def delete(self):
+        _, user_id, token = self._account()
+        note_id = self._note(user_id, pop=True) or "missing"
+        return await self.client.delete(f"/api/notes/{note_id}", headers=self._auth(token))
+
+    async def run(self, scenario: str, total: int, concurrency: int) -> dict:
+        action = getattr(self, scenario)
+        latencies = []
+        errors = {}
+        remaining = total
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                response = await action()
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        return {
+            "scenario": scenario,
+            "requests": total,
+            "concurrency": concurrency,
+            "errors": errors,
+            **summarize(latencies, elapsed)
+        }
+
+BENCH_DB_PREFIX = "notes_bench_"
+
+async def _connect(backend: str):
+    from db.mongodb import Database, init_db
+
+    # Never the app's database: the run ends by dropping this one
+    Database.database_name = f"{BENCH_DB_PREFIX}{uuid4().hex[:12]}"
+    if backend == "mongomock":
+        from mongomock_motor import AsyncMongoMockClient
+
+        Database.client = AsyncMongoMockClient()
+        Database._loop = asyncio.get_running_loop()
+    else:
+        if not os.getenv("MONGODB_URL"):
+            raise SystemExit("MONGODB_URL must point at a local mongod for --backend mongod")
+        await init_db()
+    return Database
+
+async def _drop_bench_db(database, name: str):
+    if name != database.database_name or not name.startswith(BENCH_DB_PREFIX):
+        raise RuntimeError(f"Refusing to drop database '{name}': not created by this benchmark")
+    await database.client.drop_database(name)
+
+async def main_async(args) -> list:
+    import httpx
+    from main import app
+
+    database = await _connect(args.backend)
+    db = await database.get_db()
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+            load_test = LoadTest(client, db, args.users, args.notes, args.seed)
+            await load_test.seed()
+            for scenario in args.scenarios:
+                # Warm-up requests are not counted
+                await load_test.run(scenario, min(args.warmup, args.requests), 1)
+                result = await load_test.run(scenario, args.requests, args.concurrency)
+                results.append(result)
+                print(json.dumps(result), flush=True)
+    finally:
+        await _drop_bench_db(database, db.name)
+        await database.close_db()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["mongomock", "mongod"], default="mongomock")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--notes", type=int, default=100, help="seeded notes per user")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write all results to this JSON file")
+    args = parser.parse_args()
+
+    # Keep access-log output from drowning the results
+    os.environ.setdefault("ACCESS_LOG_SAMPLE_RATE", "0")
+    # A handful of seeded users would otherwise hit the per-user limits
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    logging.disable(logging.INFO)
+
+    results = asyncio.run(main_async(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
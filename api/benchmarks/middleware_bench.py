@@ -0,0 +1,181 @@
+"""Compare the legacy @app.middleware("http") logging stack with the raw ASGI
+AccessLogMiddleware on GET /api/notes.
+
+Run from the api directory:
+
+    python -m benchmarks.middleware_bench --requests 5000 --concurrency 50
+
+The notes route is served from a fixed in-memory payload so the numbers
+isolate middleware overhead from MongoDB. Output is one JSON object per stack.
+"""
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from typing import List
+from models.note import NoteResponse
+from middleware.access_log import AccessLogMiddleware
+from utils.log import setup_logging, stop_logging
+from benchmarks.stats import summarize
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+def _notes_payload(count: int) -> List[NoteResponse]:
+    now = int(time.time())
+    return [
+        NoteResponse(
+            note_id=f"note-{i}",
+            user_id="bench-user",
+            created_by="bench",
+            note_title=f"Note {i}",
+            note_content="Lorem ipsum dolor sit amet " * 4,
+            color="yellow",
+            created_on=now,
+            last_update=now
+        )
+        for i in range(count)
+    ]
+
+def _base_app(notes: List[NoteResponse]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/notes", response_model=List[NoteResponse])
+    async def get_user_notes():
+        return notes
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE"],
+        allow_headers=["*"],
+    )
+    return app
+
+def legacy_app(notes: List[NoteResponse]) -> FastAPI:
+    """The pre-ASGI stack: BaseHTTPMiddleware, pretty-printed headers and
+    body replay through request._receive."""
+    app = _base_app(notes)
+
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        req_headers = dict(request.headers)
+        if "authorization" in req_headers:
+            req_headers["authorization"] = "Bearer [MASKED]"
+        request_info = {
+            "method": request.method,
+            "url": str(request.url),
+            "path": request.url.path,
+            "query_params": dict(request.query_params),
+            "headers": req_headers,
+            "client": request.client.host if request.client else "unknown"
+        }
+        logging.info(f"Request: {json.dumps(request_info, indent=2)}")
+        if request.method in ["POST", "PUT"]:
+            body_bytes = await request.body()
+
+            async def receive():
+                return {"type": "http.request", "body": body_bytes}
+
+            request._receive = receive
+        response = await call_next(request)
+        logging.info(f"Response: {response.status_code}")
+        return response
+
+    return app
+
+def asgi_app(notes: List[NoteResponse]) -> FastAPI:
+    app = _base_app(notes)
+    app.add_middleware(AccessLogMiddleware)
+    return app
+
+async def _call(app, path: str) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"bench"),
+            (b"authorization", b"Bearer bench-token"),
+            (b"user-agent", b"middleware-bench"),
+            (b"accept", b"application/json"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    sent_request = False
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return time.perf_counter() - start
+
+async def run(app, total: int, concurrency: int) -> dict:
+    # Warm up routing, pydantic and logging paths
+    for _ in range(min(50, total)):
+        await _call(app, "/api/notes")
+
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            latencies.append(await _call(app, "/api/notes"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {"requests": total, "concurrency": concurrency, **summarize(latencies, elapsed)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--notes", type=int, default=50, help="notes per response")
+    args = parser.parse_args()
+
+    notes = _notes_payload(args.notes)
+    results = {}
+
+    # Legacy stack logged synchronously to a stream handler
+    devnull = open(os.devnull, "w")
+    logging.basicConfig(level=logging.INFO, handlers=[logging.StreamHandler(devnull)], force=True)
+    results["legacy"] = asyncio.run(run(legacy_app(notes), args.requests, args.concurrency))
+
+    # New stack logs through the queue listener; point its output at devnull too
+    sys.stdout, real_stdout = devnull, sys.stdout
+    try:
+        setup_logging()
+        results["asgi"] = asyncio.run(run(asgi_app(notes), args.requests, args.concurrency))
+        stop_logging()
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+
+    for stack, result in results.items():
+        print(json.dumps({"stack": stack, **result}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Micro-benchmark for NoteResponse list serialization.
+
+Run from the api directory:
+
+    python -m benchmarks.serialization_bench --sizes 1000 10000 100000
+
+"legacy" is the old path: a NoteResponse per document, a second pass through
+jsonable_encoder (what response_model validation and encoding amount to) and
+stdlib json. "fast" is utils.serialization.render_notes on documents already
+projected to the NoteResponse fields. Output is one JSON object per size.
+"""
+from fastapi.encoders import jsonable_encoder
+from models.note import NoteResponse
+from utils.serialization import NOTE_FIELDS, render_notes
+import argparse
+import json
+import statistics
+import time
+
+def _documents(count: int, projected: bool) -> list:
+    now = int(time.time())
+    docs = []
+    for i in range(count):
+        doc = {
+            "note_id": f"00000000-0000-0000-0000-{i:012d}",
+            "user_id": "bench-user",
+            "created_by": "bench",
+            "note_title": f"Note {i}",
+            "note_content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 3,
+            "color": "yellow",
+            "created_on": now - i,
+            "last_update": now,
+            "version": 3,
+        }
+        if not projected:
+            # What an unprojected find() used to hand back
+            doc.update({"_id": f"{i:024x}", "updated_by": "bench"})
+        else:
+            doc = {field: doc[field] for field in NOTE_FIELDS}
+        docs.append(doc)
+    return docs
+
+def legacy(docs: list) -> bytes:
+    models = [NoteResponse(**doc) for doc in docs]
+    return json.dumps(jsonable_encoder(models)).encode()
+
+def fast(docs: list) -> bytes:
+    return render_notes(docs)
+
+def _time(fn, docs: list, repeat: int) -> dict:
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(fn(docs))
+        timings.append(time.perf_counter() - start)
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "min_ms": round(min(timings) * 1000, 2),
+        "bytes": size,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        repeat = max(1, args.repeat if size < 100000 else args.repeat // 2)
+        legacy_result = _time(legacy, _documents(size, projected=False), repeat)
+        fast_result = _time(fast, _documents(size, projected=True), repeat)
+        print(json.dumps({
+            "notes": size,
+            "legacy": legacy_result,
+            "fast": fast_result,
+            "speedup": round(legacy_result["median_ms"] / max(fast_result["median_ms"], 1e-6), 2),
+        }))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import statistics
+from typing import List
+
+def summarize(latencies: List[float], elapsed: float) -> dict:
+    """Throughput and latency percentiles (ms) for one benchmark run."""
+    if len(latencies) < 2:
+        latencies = latencies * 2 or [0.0, 0.0]
+    quantiles = statistics.quantiles(sorted(latencies), n=100)
+    return {
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(quantiles[49] * 1000, 3),
+        "p95_ms": round(quantiles[94] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3),
+    }
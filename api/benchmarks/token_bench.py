@@ -0,0 +1,82 @@
+"""Per-request cost of turning a bearer token into the authenticated user.
+
+Run from the api directory:
+
+    python -m benchmarks.token_bench --iterations 20000
+
+"legacy" is the old path: a full python-jose decode of a user_id-only token
+on every request, followed by a users lookup. "cold" is the new path on a
+claims-cache miss: key-ring decode of a token that embeds user_name, so no
+lookup. "warm" is a claims-cache hit: sha256 plus a dict lookup.
+
+With MONGODB_URL set, the legacy figure includes a real
+`users.find_one({"user_id"})`. Otherwise it covers the decode only and the
+lookup's round trip has to be added on top. Output is one JSON object.
+"""
+from datetime import timedelta
+from jose import jwt
+from uuid import uuid4
+import argparse
+import asyncio
+import json
+import os
+import time
+
+async def _legacy(token: str, iterations: int, db) -> float:
+    from utils.auth import SECRET_KEY, ALGORITHM
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if db is not None:
+            await db.users.find_one({"user_id": payload["user_id"]})
+    return time.perf_counter() - start
+
+def _new(token: str, iterations: int, warm: bool) -> float:
+    from middleware.auth_middleware import _claims_from_token, token_cache
+
+    _claims_from_token(token)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        if not warm:
+            token_cache.clear()
+        _claims_from_token(token)
+    return time.perf_counter() - start
+
+async def main_async(args) -> dict:
+    from utils.auth import SECRET_KEY, ALGORITHM, create_access_token
+
+    user_id = str(uuid4())
+    expires = timedelta(minutes=30)
+    legacy_token = jwt.encode(
+        {"user_id": user_id, "exp": int(time.time()) + 1800},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+    new_token = create_access_token({"user_id": user_id, "user_name": "bench"}, expires)
+
+    db = None
+    if os.getenv("MONGODB_URL"):
+        from db.mongodb import Database
+
+        db = await Database.get_db()
+
+    results = {
+        "legacy": await _legacy(legacy_token, args.iterations, db),
+        "cold": _new(new_token, args.iterations, warm=False),
+        "warm": _new(new_token, args.iterations, warm=True),
+    }
+    return {
+        "iterations": args.iterations,
+        "legacy_includes_lookup": db is not None,
+        **{f"{name}_us": round(elapsed / args.iterations * 1e6, 2) for name, elapsed in results.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args))))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from pymongo import ReturnDocument
+from utils.single_flight import SingleFlight
+import os
+
+# One document per user whose `version` is bumped after every write to that
+# user's notes, so a list ETag can be checked without reading any notes.
+
+# Concurrent list requests for one user share a single version read.
+# SINGLE_FLIGHT_WINDOW (seconds) also reuses it briefly afterwards; other
+# workers' writes can then go unseen for up to that long.
+version_flight = SingleFlight("notes_version", window=float(os.getenv("SINGLE_FLIGHT_WINDOW", 0)))
+
+async def _read_notes_version(db, user_id: str) -> int:
+    doc = await db.note_versions.find_one({"user_id": user_id}, {"_id": 0, "version": 1})
+    return doc["version"] if doc else 0
+
+async def get_notes_version(db, user_id: str) -> int:
+    return await version_flight.do(user_id, lambda: _read_notes_version(db, user_id))
+
+async def bump_notes_version(db, user_id: str) -> int:
+    doc = await db.note_versions.find_one_and_update(
+        {"user_id": user_id},
+        {"$inc": {"version": 1}},
+        projection={"_id": 0, "version": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    version_flight.forget(user_id)
+    return doc["version"]
@@ -0,0 +1,121 @@
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+import logging
+import os
+
+INDEXES = {
+    "users": [
+        IndexModel([("user_email", ASCENDING)], name="user_email_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "notes": [
+        IndexModel([("note_id", ASCENDING)], name="note_id_unique", unique=True),
+        # Serves the per-user listing and its keyset sort on
+        # (last_update, note_id) without an in-memory sort.
+        IndexModel(
+            [("user_id", ASCENDING), ("last_update", DESCENDING), ("note_id", DESCENDING)],
+            name="user_id_last_update"
+        ),
+        # Purges tombstones of deleted notes once `purge_at` has passed
+        IndexModel([("purge_at", ASCENDING)], name="purge_at_ttl", expireAfterSeconds=0),
+        # Per-user full-text search; queries must filter on user_id equality.
+        IndexModel(
+            [("user_id", ASCENDING), ("note_title", TEXT), ("note_content", TEXT)],
+            name="user_id_text",
+            weights={"note_title": 3, "note_content": 1}
+        ),
+    ],
+    "note_versions": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    # Only used with RATE_LIMIT_BACKEND=mongo; drops idle token buckets
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# One entry per query shape issued by the routers and the auth middleware:
+# (collection, filter, sort). Values are placeholders; only the shape matters
+# to the planner.
+QUERY_SHAPES = [
+    ("users", {"user_email": "shape@example.com"}, None),
+    ("users", {"user_id": "shape"}, None),
+    ("notes", {"user_id": "shape", "deleted_at": None}, None),
+    ("notes", {"note_id": "shape", "user_id": "shape", "deleted_at": None}, None),
+    ("notes", {"user_id": "shape", "deleted_at": None}, [("last_update", -1), ("note_id", -1)]),
+    (
+        "notes",
+        {
+            "user_id": "shape",
+            "deleted_at": None,
+            "$or": [
+                {"last_update": {"$lt": 0}},
+                {"last_update": 0, "note_id": {"$lt": "shape"}},
+            ]
+        },
+        [("last_update", -1), ("note_id", -1)]
+    ),
+    (
+        "notes",
+        {"user_id": "shape", "last_update": {"$gte": 0}},
+        [("last_update", 1), ("note_id", 1)]
+    ),
+    ("note_versions", {"user_id": "shape"}, None),
+    ("notes", {"user_id": "shape", "deleted_at": None, "$text": {"$search": "shape"}}, None),
+]
+
+# When set, startup fails unless every QUERY_SHAPES entry uses an index
+VERIFY_QUERY_PLANS = os.getenv("MONGODB_VERIFY_QUERY_PLANS", "false").lower() == "true"
+
+class QueryPlanError(RuntimeError):
+    pass
+
+async def ensure_indexes(db):
+    """Create the indexes in INDEXES. Existing indexes are left untouched."""
+    for collection, indexes in INDEXES.items():
+        names = await db[collection].create_indexes(indexes)
+        logging.info(f"Indexes ensured on {collection}: {names}")
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+async def verify_query_plans(db):
+    """Explain every entry in QUERY_SHAPES and raise if any would COLLSCAN."""
+    failures = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.limit(1).explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in set(_stages(winning_plan)):
+            failures.append(f"{collection} {query} sort={sort}")
+    if failures:
+        raise QueryPlanError("Collection scan in query plan for: " + "; ".join(failures))
+    logging.info(f"Verified {len(QUERY_SHAPES)} query plans use indexes")
+
+async def bootstrap_indexes(db):
+    await ensure_indexes(db)
+    if VERIFY_QUERY_PLANS:
+        await verify_query_plans(db)
+
+if __name__ == "__main__":
+    # Run from the api directory: python -m db.indexes
+    import asyncio
+    from db.mongodb import Database
+
+    async def main():
+        await Database.connect_db()
+        db = await Database.get_db()
+        await ensure_indexes(db)
+        await verify_query_plans(db)
+        await Database.close_db()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
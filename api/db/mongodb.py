@@ -1,27 +1,81 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
+import asyncio
 import os
+import time
 from datetime import datetime
 from uuid import uuid4
+from db.indexes import bootstrap_indexes
+from db.monitoring import command_listener
+
+def client_options() -> dict:
+    """Pool, timeout and compression settings for the Motor client.
+
+    Wire compression defaults to zlib, which needs no extra package. With
+    zstandard or python-snappy installed, MONGODB_COMPRESSORS can list them
+    first (e.g. "zstd,zlib").
+    """
+    return {
+        "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", 50)),
+        "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", 0)),
+        "maxIdleTimeMS": int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", 60000)),
+        "waitQueueTimeoutMS": int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+        "connectTimeoutMS": int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", 5000)),
+        "socketTimeoutMS": int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", 20000)),
+        "compressors": os.getenv("MONGODB_COMPRESSORS", "zlib"),
+        "retryWrites": True,
+        "event_listeners": [command_listener],
+    }
 
 class Database:
+    """Process-wide Motor client.
+
+    The client is created lazily on first use and reused for as long as its
+    event loop is alive, so warm serverless invocations share one pool even
+    when startup events never fire.
+    """
     client: AsyncIOMotorClient = None
+    database_name = os.getenv("MONGODB_DATABASE", "notes_app")
+    _loop = None
     
+    @classmethod
+    def _connect(cls):
+        loop = asyncio.get_running_loop()
+        if cls.client is not None and (cls._loop is loop or not cls._loop.is_closed()):
+            return
+        if cls.client is not None:
+            # The loop the old client was bound to is gone; its sockets are too
+            cls.client.close()
+        cls.client = AsyncIOMotorClient(os.getenv("MONGODB_URL"), **client_options())
+        cls._loop = loop
+
     @classmethod
     async def connect_db(cls):
-        cls.client = AsyncIOMotorClient(os.getenv("MONGODB_URL"))
+        cls._connect()
         
     @classmethod
     async def close_db(cls):
         if cls.client is not None:
             cls.client.close()
+            cls.client = None
+            cls._loop = None
             
     @classmethod
     async def get_db(cls):
-        return cls.client.notes_app
+        cls._connect()
+        return cls.client[cls.database_name]
+
+    @classmethod
+    async def ping(cls) -> float:
+        """Readiness probe: one round trip to the server; returns latency in ms."""
+        db = await cls.get_db()
+        start = time.perf_counter()
+        await db.command("ping")
+        return (time.perf_counter() - start) * 1000
 
 async def init_db():
     await Database.connect_db()
+    await bootstrap_indexes(await Database.get_db())
 
 async def close_db():
-    await Database.close_db() 
\ No newline at end of file
+    await Database.close_db()
@@ -0,0 +1,62 @@
+from pymongo import monitoring
+from utils.metrics import mongo_command_duration, mongo_command_documents, mongo_command_failures
+from utils.profiling import current_request
+import threading
+
+def _collection(event_command: dict, command_name: str) -> str:
+    if command_name == "getMore":
+        return str(event_command.get("collection", ""))
+    target = event_command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+def _document_count(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if "n" in reply:
+        return int(reply["n"])
+    if reply.get("value") is not None:  # findAndModify
+        return 1
+    return 0
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Feeds Motor command timings and document counts into utils.metrics,
+    and each command's duration into the issuing request's RequestStats.
+
+    pymongo calls listeners from its own threads, so in-flight commands are
+    tracked under a lock.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _key(self, event):
+        return (event.request_id, event.connection_id)
+
+    def _observe(self, event, labels: dict):
+        seconds = event.duration_micros / 1e6
+        mongo_command_duration.observe(seconds, **labels)
+        stats = current_request.get()
+        if stats is not None:
+            stats.add_mongo(seconds)
+
+    def started(self, event):
+        with self._lock:
+            self._pending[self._key(event)] = _collection(event.command, event.command_name)
+
+    def succeeded(self, event):
+        with self._lock:
+            collection = self._pending.pop(self._key(event), "")
+        labels = {"collection": collection, "command": event.command_name}
+        self._observe(event, labels)
+        mongo_command_documents.inc(_document_count(event.reply), **labels)
+
+    def failed(self, event):
+        with self._lock:
+            collection = self._pending.pop(self._key(event), "")
+        labels = {"collection": collection, "command": event.command_name}
+        self._observe(event, labels)
+        mongo_command_failures.inc(**labels)
+
+command_listener = CommandMetricsListener()
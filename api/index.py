@@ -1,21 +1,73 @@
+import asyncio
 import os
-from mangum import Mangum
+import time
 import logging
 
-
+# Cold start: everything below runs once per container, during the platform's
+# init phase. The Motor client created here, and its first pooled connection,
+# are reused by every warm invocation that follows.
+_started = time.perf_counter()
 
 try:
-    from main import app
-    handler = Mangum(app)
+    from utils.startup import ImportTimer
+
+    with ImportTimer() as import_timer:
+        from mangum import Mangum
+        from main import app
+        from db.mongodb import Database, init_db
+        from db.indexes import QueryPlanError
+
+    def _event_loop():
+        # Mangum runs each invocation on this same loop
+        try:
+            return asyncio.get_event_loop()
+        except RuntimeError:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            return loop
+
+    async def _prewarm() -> float:
+        start = time.perf_counter()
+        # Indexes are a deploy-time step (python -m db.indexes), not something
+        # every cold start should pay for; set this to build them here anyway.
+        if os.getenv("MONGODB_BOOTSTRAP_INDEXES", "false").lower() == "true":
+            await init_db()
+        else:
+            await Database.connect_db()
+        await Database.ping()
+        return (time.perf_counter() - start) * 1000
+
+    prewarm_ms = None
+    if os.getenv("MONGODB_PREWARM", "true").lower() == "true":
+        try:
+            prewarm_ms = round(_event_loop().run_until_complete(_prewarm()), 1)
+        except QueryPlanError:
+            # Raised only when verification was asked for; fail the cold start
+            raise
+        except Exception as e:
+            # Not fatal: the client connects lazily on the first request instead
+            logging.error(f"Database prewarm failed: {str(e)}")
+
+    startup_report = {
+        **import_timer.report(),
+        "prewarm_ms": prewarm_ms,
+        "total_ms": round((time.perf_counter() - _started) * 1000, 1),
+    }
+    logging.info(f"Cold start: {startup_report}")
+
+    # Lifespan is off: with it on, Mangum runs startup and shutdown around
+    # every invocation, closing the Motor client each time.
+    handler = Mangum(app, lifespan="off")
 except Exception as e:
     logging.error(f"Error importing app: {str(e)}", exc_info=True)
-    
+    error = str(e)
+
     # Create a fallback handler that returns error information
     def handler(event, context):
         return {
             "statusCode": 500,
-            "body": f"Server configuration error: {str(e)}",
+            "body": f"Server configuration error: {error}",
             "headers": {
                 "Content-Type": "text/plain"
             }
-        } 
\ No newline at end of file
+        }
@@ -1,19 +1,24 @@
-import sys
 import logging
-import json
 import os
 import asyncio
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from apis.api_router import router
 from db.mongodb import init_db, close_db
+from db.indexes import VERIFY_QUERY_PLANS, QueryPlanError
+from utils.hashing import hasher
+from utils.log import setup_logging
+from utils.serialization import DefaultResponse
+from utils.note_events import note_events
+from middleware.access_log import AccessLogMiddleware
+from middleware.compression import CompressionMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.profiling import ProfilingMiddleware
+from middleware.rate_limit import AdmissionControlMiddleware, pool_timeout_handler
+from pymongo.errors import WaitQueueTimeoutError
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout)]
-)
+setup_logging()
 
 
 dotenv_path = os.path.join(os.path.dirname(__file__), "..", ".env")
@@ -27,7 +32,8 @@ else:
 app = FastAPI(
     title="Notes API",
     description="API for user authentication and notes",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponse
 )
 
 
@@ -49,32 +55,52 @@ origins = [
     # we can also allow all origins by using "*"
 ]
 
+# Innermost: sees route templates and ETags, and leaves small error bodies alone
+app.add_middleware(CompressionMiddleware)
+
+# Inside CORS, so shed requests still get CORS headers
+app.add_middleware(AdmissionControlMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins, 
     allow_credentials=True, 
     allow_methods=["GET", "POST", "PUT", "DELETE"], 
     allow_headers=["*"],  
+    expose_headers=[
+        "ETag",
+        "X-Next-Cursor",
+        "X-Profile-Id",
+        "Server-Timing",
+        "Retry-After",
+        "RateLimit-Limit",
+        "RateLimit-Remaining",
+        "RateLimit-Reset"
+    ],
 )
 
+app.add_middleware(MetricsMiddleware)
+
+# Just inside the access log, which reads its per-request timings
+app.add_middleware(ProfilingMiddleware)
+
+# Added last so it is outermost and times the whole stack, CORS included
+app.add_middleware(AccessLogMiddleware)
+
 @app.on_event("startup")
 async def startup_db_client():
     try:
-        # Print all environment variables (except sensitive ones)
-        env_vars = {k: v if not any(secret in k.lower() for secret in ["key", "secret", "token", "password"]) else "[MASKED]" 
-                   for k, v in os.environ.items()}
-        logging.info(f"Environment variables: {env_vars}")
-        
-        # Check MongoDB URL
-        mongodb_url = os.getenv("MONGODB_URL")
-        
-        logging.info(f"MONGODB_URL is set: {mongodb_url}")
-        
+        if not os.getenv("MONGODB_URL"):
+            logging.warning("MONGODB_URL is not set")
+
         # Initialize database connection
         await init_db()
         logging.info("Database initialized successfully")
     except Exception as e:
         logging.error(f"Failed to initialize database: {str(e)}")
+        # Explicitly asked-for plan verification must stop the worker booting
+        if VERIFY_QUERY_PLANS or isinstance(e, QueryPlanError):
+            raise
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
@@ -82,9 +108,13 @@ async def shutdown_db_client():
         await close_db()
     except Exception as e:
         logging.error(f"Error closing DB connection: {str(e)}")
+    await note_events.stop()
+    hasher.shutdown()
 
 app.include_router(router)
 
+app.add_exception_handler(WaitQueueTimeoutError, pool_timeout_handler)
+
 database_url = os.getenv("DATABASE_URL")
 
 # print(database_url,"sdfdf")
@@ -102,77 +132,6 @@ async def read_root():
     }
     
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    # Ensure event loop is available for each request
-    await check_event_loop()
-    
-    # Get MongoDB URL (log it securely)
-    mongoUrl = os.getenv("MONGODB_URL", "Not set")
-    
-    masked_url = f"{mongoUrl[:15]}..." if len(mongoUrl) > 15 else "Not set properly"
-    logging.info(f"MongoDB URL: {masked_url}")
-    
-    # Create log data from request
-    req_headers = dict(request.headers)
-    if "authorization" in req_headers:
-        req_headers["authorization"] = "Bearer [MASKED]"
-    if "cookie" in req_headers:
-        req_headers["cookie"] = "[MASKED]"
-        
-    request_info = {
-        "method": request.method,
-        "url": str(request.url),
-        "path": request.url.path,
-        "query_params": dict(request.query_params),
-        "headers": req_headers,
-        "client": request.client.host if request.client else "unknown"
-    }
-    
-    # Log structured request data
-    logging.info(f"Request: {json.dumps(request_info, indent=2)}")
-    
-    try:
-        # For POST/PUT requests, log the body
-        if request.method in ["POST", "PUT"]:
-            try:
-                body_bytes = await request.body()
-                
-                if body_bytes:
-                    body_str = body_bytes.decode()
-                    
-                    try:
-                        body_json = json.loads(body_str)
-                        if "password" in body_json:
-                            body_json["password"] = "[MASKED]"
-                        logging.info(f"Request body: {json.dumps(body_json, indent=2)}")
-                    except json.JSONDecodeError:
-                        if len(body_str) > 1000:
-                            logging.info(f"Request body (truncated): {body_str[:1000]}...")
-                        else:
-                            logging.info(f"Request body: {body_str}")
-                    
-                    # Put body back for further processing
-                    async def receive():
-                        return {"type": "http.request", "body": body_bytes}
-                    
-                    request._receive = receive
-            except Exception as e:
-                logging.error(f"Error reading request body: {str(e)}")
-        
-        # Process the request
-        try:
-            response = await call_next(request)
-            logging.info(f"Response: {response.status_code}")
-            return response
-        except Exception as e:
-            logging.error(f"Request processing failed: {str(e)}", exc_info=True)
-            raise
-            
-    except Exception as e:
-        logging.error(f"Request middleware error: {str(e)}", exc_info=True)
-        raise
-
 # This is required by Vercel
 # from mangum import Mangum
 # handler = Mangum(app)
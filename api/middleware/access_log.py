@@ -0,0 +1,114 @@
+from typing import Dict, Optional
+import json
+import logging
+import os
+import random
+import time
+
+access_logger = logging.getLogger("access")
+
+def _load_rates(env_name: str) -> Dict[str, float]:
+    raw = os.getenv(env_name)
+    if not raw:
+        return {}
+    try:
+        return {key: float(rate) for key, rate in json.loads(raw).items()}
+    except (ValueError, AttributeError):
+        logging.error(f"Ignoring malformed {env_name}: {raw}")
+        return {}
+
+class AccessLogSampler:
+    """Decides which requests get an access-log line.
+
+    A rate for the response's status class ("2xx", "4xx", ...) wins over a
+    rate for the route, which wins over the default, so a sampled-down route
+    can still log every error.
+    """
+
+    def __init__(
+        self,
+        default_rate: float = 1.0,
+        route_rates: Optional[Dict[str, float]] = None,
+        status_rates: Optional[Dict[str, float]] = None
+    ):
+        self.default_rate = default_rate
+        self.route_rates = route_rates or {}
+        self.status_rates = status_rates or {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            default_rate=float(os.getenv("ACCESS_LOG_SAMPLE_RATE", 1.0)),
+            route_rates=_load_rates("ACCESS_LOG_ROUTE_RATES"),
+            status_rates=_load_rates("ACCESS_LOG_STATUS_RATES")
+        )
+
+    def rate(self, route: str, status_code: int) -> float:
+        status_class = f"{status_code // 100}xx"
+        if status_class in self.status_rates:
+            return self.status_rates[status_class]
+        return self.route_rates.get(route, self.default_rate)
+
+    def should_log(self, route: str, status_code: int) -> bool:
+        rate = self.rate(route, status_code)
+        return rate >= 1.0 or (rate > 0 and random.random() < rate)
+
+sampler = AccessLogSampler.from_env()
+
+class AccessLogMiddleware:
+    """Raw ASGI middleware for request timing and the access log.
+
+    `receive` and `send` are wrapped, never buffered: request and response
+    bodies are only counted, so streaming in both directions keeps working.
+    The time to the response start is sent back in `X-Process-Time`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = {"status": 500, "req_bytes": 0, "resp_bytes": 0}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["req_bytes"] += len(message.get("body", b""))
+            return message
+
+        async def timing_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                elapsed = f"{(time.perf_counter() - start) * 1000:.2f}"
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), (b"x-process-time", elapsed.encode())]
+                }
+            elif message["type"] == "http.response.body":
+                state["resp_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, timing_send)
+        finally:
+            route = getattr(scope.get("route"), "path", scope["path"])
+            if sampler.should_log(route, state["status"]):
+                client = scope.get("client")
+                # Set by ProfilingMiddleware further in
+                stats = scope.get("state", {}).get("request_stats")
+                access_logger.info({
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route,
+                    "status": state["status"],
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                    "mongo_ms": round(stats.mongo_seconds * 1000, 2) if stats else None,
+                    "mongo_commands": stats.mongo_commands if stats else None,
+                    "req_bytes": state["req_bytes"],
+                    "resp_bytes": state["resp_bytes"],
+                    "client": client[0] if client else None
+                })
@@ -1,20 +1,73 @@
 from fastapi import Request, HTTPException, status
 from fastapi.security import HTTPBearer
-from utils.auth import get_current_user_id
+from utils.auth import decode_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from utils.cache import TTLCache
+from utils.single_flight import SingleFlight
 from db.mongodb import Database
-import logging
-
-logging.basicConfig(level=logging.INFO)
+from models.user import AuthUser
+from pymongo.errors import WaitQueueTimeoutError
+import hashlib
+import os
+import time
 
 security = HTTPBearer()
 
+AUTH_USER_PROJECTION = {"_id": 0, "user_id": 1, "user_name": 1}
+
+# user_id -> AuthUser, so authenticated requests skip the users lookup
+user_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_USER_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("AUTH_USER_CACHE_TTL", 60))
+)
+# sha256(token) -> verified claims, kept no longer than the token's own `exp`
+token_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("AUTH_TOKEN_CACHE_TTL", ACCESS_TOKEN_EXPIRE_MINUTES * 60))
+)
+
+# Concurrent cache misses for one user share a single users lookup
+user_flight = SingleFlight("auth_user")
+
+def invalidate_user(user_id: str):
+    """Drop a cached user; call from every path that writes a user document."""
+    user_cache.invalidate(user_id)
+    user_flight.forget(user_id)
+
+def auth_cache_stats() -> dict:
+    return {"users": user_cache.stats(), "tokens": token_cache.stats()}
+
+def _claims_from_token(token: str) -> dict:
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    claims = token_cache.get(token_key)
+    if claims is not None:
+        return claims
+    payload = decode_access_token(token)
+    claims = {"user_id": payload["user_id"], "user_name": payload.get("user_name")}
+    if "exp" in payload:
+        token_cache.set(token_key, claims, ttl=payload["exp"] - time.time())
+    return claims
+
+async def _fetch_user(user_id: str):
+    db = await Database.get_db()
+    doc = await db.users.find_one({"user_id": user_id}, AUTH_USER_PROJECTION)
+    if not doc:
+        return None
+    user = AuthUser(**doc)
+    user_cache.set(user_id, user)
+    return user
+
+async def _load_user(user_id: str):
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    return await user_flight.do(user_id, lambda: _fetch_user(user_id))
+
 async def get_user_from_token(request: Request):
     if "authorization" not in request.headers:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authorization header missing"
         )
-    logging.info("middleware accessed!",request.headers)
     try:
         # Get token from header
         auth_header = request.headers["authorization"]
@@ -26,14 +79,17 @@ async def get_user_from_token(request: Request):
                 detail="Invalid authentication scheme"
             )
         
-        # Validate token and get user_id
-        user_id = await get_current_user_id(token)
+        # Validate token and get its claims
+        claims = _claims_from_token(token)
+        user_id = claims["user_id"]
         
-        # Get user details from database
-        db = await Database.get_db()
-        user = await db.users.find_one({"user_id": user_id})
-      
-        logging.info("userDetails from token!",user)
+        # Tokens carrying user_name need no lookup; older ones fall back to
+        # the user cache and then the database
+        if claims["user_name"] is not None:
+            user = AuthUser(**claims)
+        else:
+            user = await _load_user(user_id)
+
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -44,6 +100,9 @@ async def get_user_from_token(request: Request):
         request.state.user = user
         request.state.user_id = user_id
         
+    except WaitQueueTimeoutError:
+        # Pool exhausted, not a bad token: let the 503 handler answer
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
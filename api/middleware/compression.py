@@ -0,0 +1,254 @@
+from typing import Callable, Dict, Optional
+from utils.cache import TTLCache
+from utils.etag import encoded_etag
+import asyncio
+import gzip
+import json
+import logging
+import os
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+def _compressors() -> Dict[str, Callable[[bytes, int], bytes]]:
+    available = {"gzip": lambda body, level: gzip.compress(body, compresslevel=level)}
+    if brotli is not None:
+        available["br"] = lambda body, level: brotli.compress(body, quality=level)
+    if zstandard is not None:
+        available["zstd"] = lambda body, level: zstandard.ZstdCompressor(level=level).compress(body)
+    return available
+
+COMPRESSORS = _compressors()
+# Server preference when the client accepts several encodings equally
+PREFERENCE = ["zstd", "br", "gzip"]
+DEFAULT_LEVELS = {"gzip": 6, "br": 4, "zstd": 3}
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    candidates = [
+        encoding for encoding in PREFERENCE
+        if encoding in COMPRESSORS and weights.get(encoding, weights.get("*", 0)) > 0
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda encoding: weights.get(encoding, weights.get("*", 0)))
+
+class RoutePolicy:
+    def __init__(self, min_size: int, levels: Dict[str, int]):
+        self.min_size = min_size
+        self.levels = levels
+
+def _load_policies(default: RoutePolicy) -> Dict[str, RoutePolicy]:
+    """COMPRESSION_ROUTES maps route templates to {"min_size", "level"} where
+    level may be a number for every encoding or a per-encoding dict; a
+    min_size of -1 disables compression for that route."""
+    raw = os.getenv("COMPRESSION_ROUTES")
+    if not raw:
+        return {}
+    policies = {}
+    try:
+        for route, config in json.loads(raw).items():
+            level = config.get("level", {})
+            levels = dict(default.levels)
+            if isinstance(level, dict):
+                levels.update(level)
+            else:
+                levels = {encoding: int(level) for encoding in levels}
+            policies[route] = RoutePolicy(int(config.get("min_size", default.min_size)), levels)
+    except (ValueError, AttributeError):
+        logging.error(f"Ignoring malformed COMPRESSION_ROUTES: {raw}")
+    return policies
+
+def _vary_header(headers) -> tuple:
+    """One Vary header: the response's own values plus Accept-Encoding."""
+    vary = [value for name, value in headers if name == b"vary"]
+    if any(
+        token.strip().lower() in (b"accept-encoding", b"*")
+        for value in vary for token in value.split(b",")
+    ):
+        return (b"vary", b", ".join(vary))
+    return (b"vary", b", ".join(vary + [b"Accept-Encoding"]))
+
+class CompressionMiddleware:
+    """Raw ASGI response compression (gzip, plus br/zstd when installed).
+
+    Complete bodies of compressible types above a per-route minimum size are
+    compressed; streamed bodies (NDJSON, SSE) pass through untouched. Bodies
+    of `executor_threshold` bytes or more are compressed in a worker thread.
+    Responses carrying an ETag are cached compressed under (ETag, encoding),
+    so an unchanged note list is compressed once, not on every request.
+    Like the list cache, bodies over `cache_max_body` are not cached, and the
+    cache as a whole holds at most `cache_max_bytes`.
+
+    A compressed response's ETag gets the encoding as a suffix (`"...-gzip"`)
+    so it stays a valid strong validator for those exact bytes; the routes'
+    If-None-Match checks accept either form. Every response of a
+    compressible type carries `Vary: Accept-Encoding`, compressed or not.
+    """
+
+    def __init__(
+        self,
+        app,
+        min_size: int = int(os.getenv("COMPRESSION_MIN_SIZE", 1024)),
+        executor_threshold: int = int(os.getenv("COMPRESSION_EXECUTOR_THRESHOLD", 64 * 1024)),
+        cache_size: int = int(os.getenv("COMPRESSION_CACHE_SIZE", 512)),
+        cache_ttl: float = float(os.getenv("COMPRESSION_CACHE_TTL", 300)),
+        cache_max_body: int = int(
+            os.getenv("COMPRESSION_CACHE_MAX_BODY", os.getenv("LIST_CACHE_MAX_BODY", 512 * 1024))
+        ),
+        cache_max_bytes: int = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    ):
+        self.app = app
+        self.default_policy = RoutePolicy(min_size, dict(DEFAULT_LEVELS))
+        self.route_policies = _load_policies(self.default_policy)
+        self.executor_threshold = executor_threshold
+        self.cache_max_body = cache_max_body
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl, maxbytes=cache_max_bytes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate(accept) if accept else None
+        if_none_match = dict(scope["headers"]).get(b"if-none-match", b"")
+
+        start_message = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                if encoding is None or message["status"] == 304:
+                    passthrough = True
+                    if encoding is not None:
+                        # Echo the tag of the representation the client holds
+                        message = self._not_modified(message, encoding, if_none_match)
+                    await send(self._with_vary(scope, message))
+                    return
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or not self._eligible(scope, start_message, body):
+                # Streaming or not worth compressing: flush as-is from here on
+                passthrough = True
+                await send(self._with_vary(scope, start_message))
+                await send(message)
+                return
+
+            compressed = await self._compress(scope, start_message, body, encoding)
+            headers = [
+                (name, value) for name, value in start_message["headers"]
+                if name not in (b"content-length", b"vary", b"etag")
+            ]
+            headers += [
+                (b"etag", encoded_etag(value.decode("latin-1"), encoding).encode("latin-1"))
+                for name, value in start_message["headers"] if name == b"etag"
+            ]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                _vary_header(start_message["headers"]),
+            ]
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
+
+    def _with_vary(self, scope, message):
+        """Add `Vary: Accept-Encoding` to a response sent uncompressed from a
+        route that compresses, so shared caches keep the variants apart."""
+        headers = message.get("headers", [])
+        if self._policy(scope).min_size < 0:
+            return message
+        header_map = dict(headers)
+        if b"content-encoding" in header_map:
+            return message
+        content_type = header_map.get(b"content-type", b"").decode("latin-1")
+        if message["status"] != 304 and not content_type.startswith(COMPRESSIBLE_TYPES):
+            return message
+        kept = [(name, value) for name, value in headers if name != b"vary"]
+        return {**message, "headers": [*kept, _vary_header(headers)]}
+
+    @staticmethod
+    def _not_modified(message, encoding: str, if_none_match: bytes):
+        headers = []
+        for name, value in message.get("headers", []):
+            if name == b"etag":
+                tag = encoded_etag(value.decode("latin-1"), encoding).encode("latin-1")
+                if tag in if_none_match:
+                    value = tag
+            headers.append((name, value))
+        return {**message, "headers": headers}
+
+    def _policy(self, scope) -> RoutePolicy:
+        route = getattr(scope.get("route"), "path", None)
+        return self.route_policies.get(route, self.default_policy)
+
+    def _eligible(self, scope, start_message, body: bytes) -> bool:
+        if start_message["status"] != 200:
+            return False
+        policy = self._policy(scope)
+        if policy.min_size < 0 or len(body) < policy.min_size:
+            return False
+        headers = dict(start_message["headers"])
+        if b"content-encoding" in headers:
+            return False
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def _compress(self, scope, start_message, body: bytes, encoding: str) -> bytes:
+        etag = dict(start_message["headers"]).get(b"etag")
+        cache_key = (etag, encoding) if etag and len(body) <= self.cache_max_body else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        level = self._policy(scope).levels[encoding]
+        compress = COMPRESSORS[encoding]
+        if len(body) >= self.executor_threshold:
+            loop = asyncio.get_running_loop()
+            compressed = await loop.run_in_executor(None, compress, body, level)
+        else:
+            compressed = compress(body, level)
+
+        if cache_key:
+            self.cache.set(cache_key, compressed)
+        return compressed
+
+    def stats(self) -> dict:
+        return self.cache.stats()
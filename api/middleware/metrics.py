@@ -0,0 +1,66 @@
+from middleware.auth_middleware import auth_cache_stats
+from utils.hashing import hasher
+from utils.metrics import (
+    Gauge,
+    registry,
+    http_requests,
+    http_request_duration,
+    http_in_flight
+)
+import time
+
+class MetricsMiddleware:
+    """Raw ASGI middleware recording per-route request counts, latency and
+    in-flight requests. Unrouted paths share one label to bound cardinality."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status_code = 500
+
+        async def status_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc(method=method)
+        try:
+            await self.app(scope, receive, status_send)
+        finally:
+            http_in_flight.dec(method=method)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration.observe(time.perf_counter() - start, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=status_code)
+
+def _bcrypt_queue():
+    return {(): hasher.pending}
+
+def _cache_hit_rates():
+    return {(name,): stats["hit_rate"] for name, stats in auth_cache_stats().items()}
+
+def _cache_sizes():
+    return {(name,): stats["size"] for name, stats in auth_cache_stats().items()}
+
+registry.register(Gauge(
+    "bcrypt_pending", "bcrypt calls running or queued in the hashing pool.",
+    callback=_bcrypt_queue
+))
+registry.register(Gauge(
+    "cache_hit_ratio", "Lifetime hit ratio of in-process caches.", ("cache",),
+    callback=_cache_hit_rates
+))
+registry.register(Gauge(
+    "cache_entries", "Entries held by in-process caches.", ("cache",),
+    callback=_cache_sizes
+))
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,161 @@
+from fastapi import HTTPException, Request, status
+from utils.metrics import http_request_mongo_duration
+from utils.profiling import (
+    PROFILE_ADMIN_TOKEN,
+    PROFILE_SLOW_MS,
+    RequestStats,
+    StackCollector,
+    current_request,
+    profile_store,
+    sampler
+)
+import hmac
+import logging
+import os
+import sys
+import time
+
+# Captures per X-Profile-Target header, and for how long they stay armed
+PROFILE_TARGET_COUNT = int(os.getenv("PROFILE_TARGET_COUNT", 10))
+PROFILE_TARGET_TTL = float(os.getenv("PROFILE_TARGET_TTL", 600))
+# Most-sampled collapsed stacks kept per profile
+PROFILE_TOP_STACKS = 100
+
+def is_profile_admin(token: bytes) -> bool:
+    """Constant-time check of a raw X-Profile-Token header value. Compared
+    as bytes, since compare_digest rejects non-ASCII str."""
+    return bool(PROFILE_ADMIN_TOKEN) and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN.encode())
+
+async def require_profile_admin(request: Request):
+    """Dependency for the profile endpoints; they 404 while profiling is off."""
+    if not PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not is_profile_admin(request.headers.get("x-profile-token", "").encode("latin-1")):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="A valid X-Profile-Token is required"
+        )
+
+def _arm_target(header: str) -> bool:
+    kind, _, value = header.partition("=")
+    kind = kind.strip().lower()
+    if kind not in ("route", "user") or not value.strip():
+        return False
+    profile_store.arm(kind, value.strip(), PROFILE_TARGET_COUNT, PROFILE_TARGET_TTL)
+    logging.info(f"Profiling armed for {kind} {value.strip()} ({PROFILE_TARGET_COUNT} requests)")
+    return True
+
+class ProfilingMiddleware:
+    """Raw ASGI middleware timing every request and capturing slow ones.
+
+    Wall and MongoDB time go into the request's RequestStats, which the
+    access log reads from `scope["state"]`. While profiles may be kept, a
+    background sampler also records the request's stacks; the profile is
+    stored when the request took PROFILE_SLOW_MS or longer, or was asked for.
+
+    Asking takes an `X-Profile-Token` header matching PROFILE_ADMIN_TOKEN.
+    Alone, it profiles that request and returns `X-Profile-Id` and
+    `Server-Timing`. With `X-Profile-Target: route=/api/notes/{note_id}` or
+    `user=<user_id>`, it arms capture of the next PROFILE_TARGET_COUNT
+    matching requests from anyone instead.
+    """
+
+    def __init__(self, app, exempt_paths=("/api/notes/events",)):
+        self.app = app
+        # Open for as long as the client stays, so never "slow"
+        self.exempt_paths = set(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        scope.setdefault("state", {})["request_stats"] = stats
+        reset = current_request.set(stats)
+        collector = None
+        root = sys._getframe()
+        profile_id = None
+        admin = False
+        status_code = 500
+
+        async def timing_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if admin:
+                    timing = (
+                        f"app;dur={stats.wall_seconds * 1000:.1f}, "
+                        f"db;dur={stats.mongo_seconds * 1000:.1f}"
+                    )
+                    extra = [(b"server-timing", timing.encode())]
+                    if profile_id is not None:
+                        extra.append((b"x-profile-id", str(profile_id).encode()))
+                    message = {**message, "headers": [*message.get("headers", []), *extra]}
+            await send(message)
+
+        try:
+            headers = dict(scope["headers"])
+            admin = is_profile_admin(headers.get(b"x-profile-token", b""))
+            requested = admin and not (
+                b"x-profile-target" in headers
+                and _arm_target(headers[b"x-profile-target"].decode("latin-1"))
+            )
+            profiled = requested or (
+                scope["path"] not in self.exempt_paths
+                and (PROFILE_SLOW_MS > 0 or profile_store.armed)
+            )
+            if profiled:
+                collector = StackCollector()
+                sampler.watch(root, collector)
+            if requested:
+                profile_id = profile_store.next_id()
+
+            await self.app(scope, receive, timing_send)
+        finally:
+            current_request.reset(reset)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_mongo_duration.observe(
+                stats.mongo_seconds, method=scope["method"], route=route
+            )
+            if collector is not None:
+                sampler.unwatch(root)
+                self._keep(scope, stats, collector, route, status_code, profile_id)
+
+    def _keep(
+        self,
+        scope,
+        stats: RequestStats,
+        collector: StackCollector,
+        route: str,
+        status_code: int,
+        profile_id
+    ):
+        wall_ms = stats.wall_seconds * 1000
+        user_id = scope["state"].get("user_id")
+        if profile_id is not None:
+            reason = "requested"
+        elif profile_store.claim_target(route, user_id):
+            reason = "target"
+        elif 0 < PROFILE_SLOW_MS <= wall_ms:
+            reason = "slow"
+        else:
+            return
+
+        stacks = sorted(collector.stacks.items(), key=lambda item: item[1], reverse=True)
+        profile_store.add({
+            "id": profile_id if profile_id is not None else profile_store.next_id(),
+            "reason": reason,
+            "at": round(time.time(), 3),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route,
+            "user_id": user_id,
+            "status": status_code,
+            "wall_ms": round(wall_ms, 2),
+            "mongo_ms": round(stats.mongo_seconds * 1000, 2),
+            "mongo_commands": stats.mongo_commands,
+            "samples": collector.samples,
+            "sample_interval_ms": sampler.interval * 1000,
+            "stacks": dict(stacks[:PROFILE_TOP_STACKS])
+        })
@@ -0,0 +1,212 @@
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from middleware.auth_middleware import get_user_from_token
+from pymongo import ReturnDocument
+from pymongo.errors import WaitQueueTimeoutError
+from typing import Optional, Tuple
+from utils.cache import TTLCache
+import datetime
+import math
+import os
+import time
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+# Proxies in front of the app that append to X-Forwarded-For; entries left of
+# theirs are whatever the client sent and cannot be trusted
+TRUSTED_PROXY_HOPS = max(int(os.getenv("TRUSTED_PROXY_HOPS", 1)), 1)
+
+class RateLimitBackend:
+    """Token-bucket storage. `take` spends one token from the bucket at `key`
+    and returns (allowed, tokens left)."""
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        raise NotImplementedError
+
+class InMemoryBackend(RateLimitBackend):
+    """Per-process buckets. An evicted bucket simply starts full again."""
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._caches = {}
+
+    def _cache(self, rate: float, burst: int) -> TTLCache:
+        # A bucket untouched for burst / rate seconds is full; forget it then
+        key = (rate, burst)
+        if key not in self._caches:
+            self._caches[key] = TTLCache(maxsize=self.maxsize, ttl=burst / rate)
+        return self._caches[key]
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        cache = self._cache(rate, burst)
+        now = time.monotonic()
+        tokens, updated = cache.get(key) or (burst, now)
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(key, (tokens, now))
+        return allowed, tokens
+
+class MongoBackend(RateLimitBackend):
+    """Buckets shared by every worker, stored in the `rate_limits` collection.
+
+    Refill and spend happen in one atomic pipeline update; a TTL index on
+    `expires_at` removes idle buckets.
+    """
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        from db.mongodb import Database
+
+        db = await Database.get_db()
+        now = time.time()
+        expires_at = datetime.datetime.utcfromtimestamp(now + burst / rate)
+        refilled = {"$min": [burst, {"$add": [
+            {"$ifNull": ["$tokens", burst]},
+            {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, rate]}
+        ]}]}
+        bucket = await db.rate_limits.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated": now, "expires_at": expires_at}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return bucket["allowed"], bucket["tokens"]
+
+def _backend() -> RateLimitBackend:
+    if os.getenv("RATE_LIMIT_BACKEND", "memory").lower() == "mongo":
+        return MongoBackend()
+    return InMemoryBackend()
+
+class RateLimiter:
+    """One token-bucket policy; `check` is awaited from route dependencies."""
+
+    def __init__(self, name: str, rate: float, burst: int, backend: RateLimitBackend):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.backend = backend
+
+    async def check(self, request: Request, key: str):
+        if not RATE_LIMIT_ENABLED:
+            return
+        allowed, tokens = await self.backend.take(f"{self.name}:{key}", self.rate, self.burst)
+        headers = {
+            "RateLimit-Limit": str(self.burst),
+            "RateLimit-Remaining": str(max(0, math.floor(tokens))),
+            # Seconds until the bucket is full again
+            "RateLimit-Reset": str(math.ceil((self.burst - tokens) / self.rate)),
+        }
+        # Copied onto the response by AdmissionControlMiddleware
+        request.state.rate_limit_headers = headers
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={**headers, "Retry-After": str(math.ceil((1 - tokens) / self.rate))}
+            )
+
+backend = _backend()
+
+user_limiter = RateLimiter(
+    "user",
+    rate=float(os.getenv("RATE_LIMIT_USER_RATE", 20)),
+    burst=int(os.getenv("RATE_LIMIT_USER_BURST", 40)),
+    backend=backend
+)
+auth_limiter = RateLimiter(
+    "auth",
+    rate=float(os.getenv("RATE_LIMIT_AUTH_RATE", 0.2)),
+    burst=int(os.getenv("RATE_LIMIT_AUTH_BURST", 10)),
+    backend=backend
+)
+
+def client_ip(request: Request) -> str:
+    """The address the outermost trusted proxy saw, counting
+    TRUSTED_PROXY_HOPS entries back from the right of X-Forwarded-For."""
+    if TRUST_PROXY_HEADERS and "x-forwarded-for" in request.headers:
+        hops = [
+            hop.strip()
+            for header in request.headers.getlist("x-forwarded-for")
+            for hop in header.split(",")
+            if hop.strip()
+        ]
+        if hops:
+            return hops[-min(TRUSTED_PROXY_HOPS, len(hops))]
+    return request.client.host if request.client else "unknown"
+
+async def limit_by_user(request: Request, _=Depends(get_user_from_token)):
+    await user_limiter.check(request, request.state.user_id)
+
+async def limit_by_ip(request: Request):
+    await auth_limiter.check(request, client_ip(request))
+
+def _busy_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"}
+    )
+
+async def pool_timeout_handler(request: Request, exc: WaitQueueTimeoutError):
+    """A request that waited waitQueueTimeoutMS for a pool connection is
+    shed like one refused at admission, not failed with a 500."""
+    return _busy_response()
+
+class AdmissionControlMiddleware:
+    """Raw ASGI middleware that caps concurrent requests.
+
+    Requests beyond `max_concurrency` get an immediate 503 instead of waiting
+    on the Motor pool; by default that is the pool size, so admitted requests
+    rarely queue for a connection. Long-lived event streams are exempt since they hold
+    no pool connection. Also copies RateLimit-* headers set by the limiters
+    onto successful responses.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_concurrency: Optional[int] = None,
+        exempt_paths=("/metrics", "/api/test-db", "/api/notes/events")
+    ):
+        self.app = app
+        if max_concurrency is None:
+            from db.mongodb import client_options
+
+            default = client_options()["maxPoolSize"]
+            max_concurrency = int(os.getenv("MAX_CONCURRENT_REQUESTS", default))
+        self.max_concurrency = max_concurrency
+        self.exempt_paths = set(exempt_paths)
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if self.in_flight >= self.max_concurrency:
+            await _busy_response()(scope, receive, send)
+            return
+
+        async def header_send(message):
+            if message["type"] == "http.response.start":
+                rate_headers = scope.get("state", {}).get("rate_limit_headers")
+                if rate_headers:
+                    existing = {name.lower() for name, _ in message.get("headers", [])}
+                    extra = [
+                        (name.lower().encode(), value.encode())
+                        for name, value in rate_headers.items()
+                        if name.lower().encode() not in existing
+                    ]
+                    message = {**message, "headers": [*message.get("headers", []), *extra]}
+            await send(message)
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, header_send)
+        finally:
+            self.in_flight -= 1
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 from uuid import UUID, uuid4
 
@@ -23,8 +23,57 @@ class NoteResponse(NoteBase):
     # user_email: str
     created_on: int
     last_update: int
+    version: int = 0
     # updated_by: Optional[str] = None
     # updated_by_email: Optional[str] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class NoteSearchResult(NoteResponse):
+    score: Optional[float] = None
+
+class NoteSearchResponse(BaseModel):
+    results: List[NoteSearchResult]
+    next_offset: Optional[int] = None
+
+class NoteChangesResponse(BaseModel):
+    notes: List[NoteResponse]
+    deleted: List[str]
+    watermark: int
+    next_cursor: Optional[str] = None
+    # `since` predates tombstone retention, so some deletions may be missing:
+    # replace local state with the notes returned instead of merging
+    full_resync: bool = False
+
+class BulkNoteOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    note_id: Optional[str] = None
+    data: Optional[NoteUpdate] = None
+
+class BulkNoteRequest(BaseModel):
+    operations: List[BulkNoteOperation]
+    ordered: bool = True
+
+class BulkNoteResult(BaseModel):
+    index: int
+    op: str
+    status: int
+    note_id: Optional[str] = None
+    note: Optional[NoteResponse] = None
+    error: Optional[str] = None
+
+class BulkNoteResponse(BaseModel):
+    ordered: bool
+    results: List[BulkNoteResult]
+
+class NoteImportError(BaseModel):
+    line: int
+    error: str
+
+class NoteImportResponse(BaseModel):
+    imported: int
+    failed: int
+    errors: List[NoteImportError]
+    # More lines failed than `errors` lists
+    errors_truncated: bool = False
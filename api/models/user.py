@@ -16,4 +16,13 @@ class UserResponse(UserBase):
     create_on: int = Field(default_factory=lambda: int(datetime.utcnow().timestamp()))
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class AuthUser(BaseModel):
+    """The authenticated user as seen by request handlers.
+
+    Only what handlers need; the password hash never leaves the database on
+    the request path.
+    """
+    user_id: str
+    user_name: str
@@ -0,0 +1,181 @@
+"""Production entry point for the Notes API.
+
+Run from the api directory:
+
+    python serve.py                      # gunicorn, one worker per core
+    WEB_CONCURRENCY=4 python serve.py    # fixed worker count
+    python serve.py --server uvicorn     # uvicorn's own supervisor, no preload
+
+Under gunicorn the app is imported once in the master (PRELOAD=true) and
+forked, so workers start warm and share the imported code pages. The Motor
+client and the bcrypt threads are created lazily, so nothing that holds
+sockets or threads crosses the fork; logging is restarted in each worker.
+uvloop and httptools are used when installed.
+
+On SIGTERM a worker stops accepting, ends open event streams with a
+`resync` (clients reconnect elsewhere), waits up to GRACEFUL_TIMEOUT for
+in-flight requests and then runs the app's shutdown handlers, which close
+the Motor client.
+
+Every worker has its own Motor pool, caches, metrics and in-memory rate
+limits: size MONGODB_MAX_POOL_SIZE per worker, and set
+RATE_LIMIT_BACKEND=mongo to share limits across workers.
+"""
+from utils.log import setup_logging
+from utils.note_events import note_events
+import argparse
+import logging
+import os
+import sys
+import uvicorn
+
+APP = "main:app"
+
+def default_workers() -> int:
+    try:
+        # Honours CPU pinning (e.g. docker --cpuset-cpus)
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return int(os.getenv("WEB_CONCURRENCY", cores))
+
+def _loop() -> str:
+    try:
+        import uvloop  # noqa: F401
+        return "uvloop"
+    except ImportError:
+        return "asyncio"
+
+def _http() -> str:
+    try:
+        import httptools  # noqa: F401
+        return "httptools"
+    except ImportError:
+        return "h11"
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn Server that closes event streams before draining, since they
+    would otherwise hold the shutdown open for the whole grace period."""
+
+    async def shutdown(self, sockets=None):
+        note_events.resync_all()
+        await super().shutdown(sockets=sockets)
+
+def run_uvicorn(args):
+    config = uvicorn.Config(
+        APP,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=_loop(),
+        http=_http(),
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        limit_max_requests=args.max_requests or None,
+        proxy_headers=True,
+        log_config=None,
+        access_log=False
+    )
+    server = DrainingServer(config)
+    if args.workers > 1:
+        from uvicorn.supervisors import Multiprocess
+
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    options = {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "serve.DrainingUvicornWorker",
+        "backlog": args.backlog,
+        "keepalive": args.keep_alive,
+        "graceful_timeout": args.graceful_timeout,
+        # A worker silent this long is killed and replaced by the master
+        "timeout": int(os.getenv("WORKER_TIMEOUT", 60)),
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10,
+        "preload_app": args.preload,
+        "post_fork": _post_fork,
+        # The app's own access log middleware covers requests
+        "accesslog": None,
+    }
+
+    class NotesApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+    NotesApplication().run()
+
+def _post_fork(server, worker):
+    from utils.log import restart_logging
+
+    restart_logging()
+
+try:
+    from uvicorn.workers import UvicornWorker
+except ImportError:  # gunicorn not installed
+    UvicornWorker = None
+
+if UvicornWorker is not None:
+    class DrainingUvicornWorker(UvicornWorker):
+        """Gunicorn worker running DrainingServer on uvloop/httptools."""
+
+        CONFIG_KWARGS = {"loop": _loop(), "http": _http(), "access_log": False}
+
+        async def _serve(self):
+            # Mirrors UvicornWorker._serve with DrainingServer swapped in
+            from gunicorn.arbiter import Arbiter
+
+            self.config.app = self.wsgi
+            server = DrainingServer(config=self.config)
+            self._install_sigquit_handler()
+            await server.serve(sockets=self.sockets)
+            if not server.started:
+                sys.exit(Arbiter.WORKER_BOOT_ERROR)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Notes API in production")
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default=os.getenv("SERVER"))
+    parser.add_argument("--host", default=os.getenv("API_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("BACKLOG", 2048)))
+    # Longer than a typical load balancer's idle timeout (60s), so the
+    # balancer, not the app, closes idle connections
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("KEEP_ALIVE", 75)))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", 30)))
+    parser.add_argument(
+        "--max-requests", type=int, default=int(os.getenv("MAX_REQUESTS", 0)),
+        help="recycle a worker after this many requests (0: never)"
+    )
+    parser.add_argument(
+        "--no-preload", dest="preload", action="store_false",
+        default=os.getenv("PRELOAD", "true").lower() == "true"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    server = args.server
+    if server is None:
+        server = "gunicorn" if UvicornWorker is not None and sys.platform != "win32" else "uvicorn"
+    logging.info(
+        f"Starting {server} with {args.workers} worker(s), loop={_loop()}, http={_http()}"
+    )
+    if server == "gunicorn":
+        run_gunicorn(args)
+    else:
+        run_uvicorn(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,104 @@
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+from functools import lru_cache
+from typing import Dict, Optional
 from fastapi import HTTPException, status
+import json
 import os
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+# passlib and python-jose are imported on first use rather than with this
+# module, which keeps them off the serverless cold-start path for requests
+# that never hash a password or touch a token.
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    # Pinning min/max to the configured cost makes hashes made with any other
+    # cost report as needing an update, so they are rehashed on the next login.
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS
+    )
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 480))  # 8 hours
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", 30))
+
+# Signing keys by `kid`. Tokens are signed with JWT_ACTIVE_KID and verified
+# with whichever key their header names, so a new key can be rolled out before
+# the old one is retired. Tokens issued before key ids existed carry no `kid`
+# and are checked against SECRET_KEY.
+DEFAULT_KID = "default"
+
+def _load_key_ring() -> Dict[str, str]:
+    keys = {DEFAULT_KID: SECRET_KEY}
+    raw = os.getenv("JWT_KEYS")
+    if raw:
+        keys.update(json.loads(raw))
+    return keys
+
+KEY_RING = _load_key_ring()
+ACTIVE_KID = os.getenv("JWT_ACTIVE_KID", DEFAULT_KID)
+if ACTIVE_KID not in KEY_RING:
+    raise RuntimeError(f"JWT_ACTIVE_KID '{ACTIVE_KID}' is not in JWT_KEYS")
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+def _encode(claims: dict) -> str:
+    from jose import jwt
+
+    return jwt.encode(claims, KEY_RING[ACTIVE_KID], algorithm=ALGORITHM, headers={"kid": ACTIVE_KID})
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """Sign an access token. Include `user_name` next to `user_id` so
+    authenticated requests can skip the user lookup."""
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    to_encode.update({"exp": expire, "type": "access"})
+    return _encode(to_encode)
 
-async def get_current_user_id(token: str) -> str:
+def create_refresh_token(user_id: str) -> str:
+    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    return _encode({"user_id": user_id, "exp": expire, "type": "refresh"})
+
+def _decode(token: str, token_type: str) -> dict:
+    from jose import JWTError, jwt
+
+    credentials_error = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials"
+    )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials"
-            )
-        return user_id
+        kid = jwt.get_unverified_header(token).get("kid", DEFAULT_KID)
+        key = KEY_RING.get(kid)
+        if key is None:
+            raise credentials_error
+        payload = jwt.decode(token, key, algorithms=[ALGORITHM])
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials"
-        ) 
\ No newline at end of file
+        raise credentials_error
+    if payload.get("user_id") is None:
+        raise credentials_error
+    # Access tokens from before token types existed have no `type`
+    if payload.get("type", "access") != token_type:
+        raise credentials_error
+    return payload
+
+def decode_access_token(token: str) -> dict:
+    return _decode(token, "access")
+
+def decode_refresh_token(token: str) -> dict:
+    return _decode(token, "refresh")
+
+async def get_current_user_id(token: str) -> str:
+    return decode_access_token(token)["user_id"]
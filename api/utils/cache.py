@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import time
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a time-to-live.
+
+    With `maxbytes`, values must support len() and the cache also evicts to
+    keep their total length within that budget.
+
+    Not thread-safe; meant to be used from the event loop only.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, maxbytes: Optional[int] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        if self.maxbytes is not None and len(value) > self.maxbytes:
+            return
+        self._remove(key)
+        self._data[key] = (value, time.monotonic() + ttl)
+        if self.maxbytes is not None:
+            self.nbytes += len(value)
+        while len(self._data) > self.maxsize or (
+            self.maxbytes is not None and self.nbytes > self.maxbytes
+        ):
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._data.pop(key, None)
+        if entry is not None and self.maxbytes is not None:
+            self.nbytes -= len(entry[0])
+
+    def invalidate(self, key: Hashable):
+        self._remove(key)
+
+    def clear(self):
+        self._data.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+        if self.maxbytes is not None:
+            stats["bytes"] = self.nbytes
+            stats["maxbytes"] = self.maxbytes
+        return stats
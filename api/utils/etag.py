@@ -0,0 +1,101 @@
+from fastapi import HTTPException, status
+from typing import List, Optional, Tuple
+import hashlib
+
+# Content-codings the compression middleware tags onto ETags, so each
+# encoded representation of a resource has its own strong tag
+ENCODING_SUFFIXES = ("gzip", "br", "zstd")
+
+def note_etag(note: dict) -> str:
+    """Strong ETag for a single note.
+
+    `version` is bumped on every write; notes written before versioning have
+    no version field and count as version 0.
+    """
+    return f'"{note.get("version", 0)}.{note["last_update"]}.{note["note_id"]}"'
+
+def notes_list_etag(user_id: str, version: int, query_string: str = "") -> str:
+    """Strong ETag for a listing: the user's notes version plus the query,
+    since limit/cursor/stream change the representation. The user is part of
+    the hash so the tag is unique across users and can key shared caches."""
+    scope_hash = hashlib.sha1(f"{user_id}?{query_string}".encode()).hexdigest()[:16]
+    return f'"list.{version}.{scope_hash}"'
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The tag for `encoding`'s representation: `"abc"` -> `"abc-gzip"`."""
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+def _strip_encoding(tag: str) -> str:
+    for encoding in ENCODING_SUFFIXES:
+        suffix = f'-{encoding}"'
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+def parse_etags(header: str, weak: bool = True) -> List[str]:
+    """Split an If-Match / If-None-Match header into tags ("*" kept).
+
+    With `weak` the W/ prefix is dropped (weak comparison); without it weak
+    tags are left out, since they can never match strongly. Encoding
+    suffixes added by the compression middleware are removed, so a tag seen
+    on a compressed response names the same resource state.
+    """
+    tags = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag:
+            tags.append(_strip_encoding(tag))
+    return tags
+
+def if_match_states(header: Optional[str], note_id: str) -> Optional[List[Tuple[int, int]]]:
+    """(version, last_update) pairs whose note ETag an If-Match header names
+    for `note_id`; None means no condition.
+
+    If-Match uses strong comparison (RFC 9110): weak tags, malformed tags
+    and tags issued for another note match nothing, so a header naming no
+    usable tag fails the precondition.
+    """
+    if not header:
+        return None
+    tags = parse_etags(header, weak=False)
+    if "*" in tags:
+        return None
+    states = []
+    for tag in tags:
+        if len(tag) < 2 or not (tag.startswith('"') and tag.endswith('"')):
+            continue
+        parts = tag[1:-1].split(".", 2)
+        if len(parts) != 3 or parts[2] != note_id:
+            continue
+        try:
+            states.append((int(parts[0]), int(parts[1])))
+        except ValueError:
+            continue
+    if not states:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Note has been modified"
+        )
+    return states
+
+def state_filter(states: List[Tuple[int, int]]) -> dict:
+    """Matches a note still in one of `states`."""
+    clauses = []
+    for version, last_update in states:
+        # Version 0 also matches notes stored before the field existed
+        versions = [version, None] if version == 0 else [version]
+        clauses.append({"version": {"$in": versions}, "last_update": last_update})
+    return {"$or": clauses}
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET)."""
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return "*" in tags or etag in tags
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from typing import Optional, Tuple
+from utils.auth import get_pwd_context
+from utils.metrics import bcrypt_duration
+import asyncio
+import os
+import time
+
+class HashingService:
+    """Runs bcrypt in a bounded thread pool so it never blocks the event loop.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism.
+    At most `workers + queue_limit` calls may be pending; beyond that callers
+    get a 503 with Retry-After instead of queueing more work.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, retry_after: int = 1):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.retry_after = retry_after
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="bcrypt"
+            )
+        return self._executor
+
+    @staticmethod
+    def _timed(operation: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            bcrypt_duration.observe(time.perf_counter() - start, operation=operation)
+
+    async def _run(self, operation: str, fn, *args):
+        if self.pending >= self.workers + self.queue_limit:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, please retry",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._timed, operation, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", get_pwd_context().hash, password)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; the second item is a new hash if the stored
+        one was made with outdated settings (e.g. a lower bcrypt cost)."""
+        return await self._run("verify", get_pwd_context().verify_and_update, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+hasher = HashingService(
+    workers=int(os.getenv("BCRYPT_WORKERS", os.cpu_count() or 1)),
+    queue_limit=int(os.getenv("BCRYPT_QUEUE_LIMIT", 64)),
+    retry_after=int(os.getenv("BCRYPT_RETRY_AFTER", 1))
+)
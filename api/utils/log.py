@@ -0,0 +1,93 @@
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """Single-line JSON; a dict passed as the message is merged into the record."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # The stock prepare() stringifies msg; keep structured dicts intact.
+        if isinstance(record.msg, dict):
+            return record
+        return super().prepare(record)
+
+def setup_logging(level=logging.INFO):
+    """Route all logging through a queue so handler I/O happens on a
+    background thread instead of the event loop. Safe to call repeatedly."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    access_handler = logging.StreamHandler(sys.stdout)
+    access_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [_QueueHandler(log_queue)]
+    root.setLevel(level)
+
+    _listener = QueueListener(
+        log_queue,
+        _RouteByLogger("access", access_handler, stream_handler),
+        respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def restart_logging():
+    """Start a fresh listener in a forked worker; the parent's listener
+    thread does not survive the fork."""
+    global _listener
+    _listener = None
+    setup_logging()
+
+class _RouteByLogger(logging.Handler):
+    """Sends records from one logger to a dedicated handler, the rest to a default."""
+
+    def __init__(self, name, handler, default):
+        super().__init__()
+        self.name_prefix = name
+        self.handler = handler
+        self.default = default
+
+    def emit(self, record):
+        if record.name == self.name_prefix or record.name.startswith(self.name_prefix + "."):
+            self.handler.handle(record)
+        else:
+            self.default.handle(record)
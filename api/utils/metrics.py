@@ -0,0 +1,168 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Tuple
+import threading
+
+# Prometheus-style metrics kept in process memory and rendered in the text
+# exposition format. Each worker process reports its own series.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _label_key(labelnames: Tuple[str, ...], labels: dict) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in values.items()
+        ]
+
+class Gauge(_Metric):
+    """A gauge set directly, or read from `callback` at scrape time. The
+    callback returns {label values tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, *args, callback: Callable[[], dict] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> list:
+        if self.callback is not None:
+            values = self.callback()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in values.items()
+        ]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        with self._lock:
+            values = {key: list(series) for key, series in self._values.items()}
+        lines = self.header()
+        for key, series in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.", ("method",)
+))
+mongo_command_duration = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency.", ("collection", "command")
+))
+mongo_command_documents = registry.register(Counter(
+    "mongo_command_documents_total", "Documents returned or written by MongoDB commands.", ("collection", "command")
+))
+mongo_command_failures = registry.register(Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands.", ("collection", "command")
+))
+bcrypt_duration = registry.register(Histogram(
+    "bcrypt_duration_seconds", "Time spent in bcrypt hash/verify, excluding queueing.", ("operation",),
+    buckets=(0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5)
+))
+singleflight_requests = registry.register(Counter(
+    "singleflight_requests_total",
+    "Reads through a single-flight group: run (leader), coalesced onto one in flight, or served from its micro-cache.",
+    ("flight", "result")
+))
+http_request_mongo_duration = registry.register(Histogram(
+    "http_request_mongo_duration_seconds", "MongoDB time spent per HTTP request, by route.", ("method", "route")
+))
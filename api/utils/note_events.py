@@ -0,0 +1,143 @@
+from pymongo.errors import OperationFailure
+from typing import Dict, Optional, Set
+import asyncio
+import contextvars
+import logging
+
+# Change streams need a replica set; standalone servers reject `watch` with
+# this code and the broker falls back to events published by the routers.
+CHANGE_STREAM_UNSUPPORTED = 40573
+# Delay before reopening a failed change stream, doubling up to the max
+WATCH_RETRY_SECONDS = 1.0
+WATCH_RETRY_MAX_SECONDS = 30.0
+
+class NoteEventBroker:
+    """Fans note change events out to this process's subscribers.
+
+    Events come from one shared MongoDB change stream per process. Where
+    change streams are unavailable, the notes router publishes its own
+    writes instead (`publish_local`), which then only reach subscribers in
+    the same process.
+
+    Each subscriber gets a bounded queue; one that falls too far behind is
+    sent a `resync` event and dropped rather than slowing everyone else down.
+    """
+
+    def __init__(self, queue_size: int = 256):
+        self.queue_size = queue_size
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self.change_stream_active = False
+        # Set once the server rejects change streams; no point asking again
+        self.change_streams_unsupported = False
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def publish(self, user_id: str, event: dict):
+        for queue in list(self.subscribers.get(user_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.unsubscribe(user_id, queue)
+                # Make room for the one event that tells the client to refetch
+                queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    def publish_local(self, user_id: str, event: dict):
+        """Called by the routers after a write; a no-op while the change
+        stream is delivering the same events."""
+        if not self.change_stream_active:
+            self.publish(user_id, event)
+
+    def resync_all(self):
+        """End every open stream with a `resync`, so clients reconnect and
+        refetch. Used on graceful drain, and when the change stream lost
+        events it cannot replay."""
+        for user_id, queues in list(self.subscribers.items()):
+            for queue in list(queues):
+                self.unsubscribe(user_id, queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    def ensure_started(self, db):
+        if self.change_streams_unsupported:
+            return
+        if self._task is None or self._task.done():
+            # In a fresh context, so the process-lifetime watcher does not
+            # inherit the first subscriber's request (and its RequestStats)
+            loop = asyncio.get_running_loop()
+            self._task = contextvars.Context().run(loop.create_task, self._watch(db))
+
+    async def _watch(self, db):
+        """Follow the notes change stream for as long as the process lives.
+
+        When the stream fails or ends it is reopened after a backoff, resuming
+        after the last event seen so nothing is missed. If it cannot resume
+        (e.g. the oplog has moved past the token), subscribers get `resync`.
+        """
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        resume_token = None
+        delay = WATCH_RETRY_SECONDS
+        while True:
+            try:
+                async with db.notes.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    self.change_stream_active = True
+                    delay = WATCH_RETRY_SECONDS
+                    logging.info("Note events: using MongoDB change stream")
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        note = change.get("fullDocument")
+                        if not note:
+                            continue
+                        self.publish(note["user_id"], _event_from_document(change["operationType"], note))
+                # Only an invalidate ends the stream; its token cannot be resumed after
+                logging.warning("Note change stream was invalidated; reopening")
+                resume_token = None
+                self.resync_all()
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_UNSUPPORTED:
+                    logging.info("Note events: change streams unavailable, using in-process events")
+                    self.change_streams_unsupported = True
+                    return
+                logging.error(f"Note change stream failed: {str(e)}")
+                if resume_token is not None and not self.change_stream_active:
+                    # Reopening from the token itself failed
+                    resume_token = None
+                    self.resync_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Note change stream failed: {str(e)}")
+            finally:
+                self.change_stream_active = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WATCH_RETRY_MAX_SECONDS)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+def _event_from_document(operation: str, note: dict) -> dict:
+    if note.get("deleted_at") is not None:
+        return {"type": "deleted", "note_id": note["note_id"]}
+    return {"type": "created" if operation == "insert" else "updated", "note": note}
+
+note_events = NoteEventBroker()
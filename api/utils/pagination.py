@@ -0,0 +1,44 @@
+from fastapi import HTTPException, status
+from typing import Optional, Tuple
+import base64
+import json
+
+MAX_PAGE_SIZE = 1000
+
+# Keyset order for note listings: newest first, note_id breaks ties so the
+# order is total and a cursor never skips or repeats a note.
+NOTES_SORT = [("last_update", -1), ("note_id", -1)]
+# Oldest first, for change feeds
+CHANGES_SORT = [("last_update", 1), ("note_id", 1)]
+
+def encode_cursor(last_update: int, note_id: str) -> str:
+    raw = json.dumps([last_update, note_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_update, note_id = json.loads(base64.urlsafe_b64decode(padded))
+        return int(last_update), str(note_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def cursor_for(note: dict) -> str:
+    return encode_cursor(note["last_update"], note["note_id"])
+
+def keyset_filter(query: dict, cursor: Optional[str], descending: bool = True) -> dict:
+    """Restrict `query` to the notes that sort strictly after `cursor`."""
+    if not cursor:
+        return query
+    last_update, note_id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    return {
+        **query,
+        "$or": [
+            {"last_update": {op: last_update}},
+            {"last_update": last_update, "note_id": {op: note_id}},
+        ]
+    }
@@ -0,0 +1,172 @@
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+import itertools
+import os
+import sys
+import threading
+import time
+
+MAX_UNIQUE_STACKS = 500
+
+class RequestStats:
+    """Wall and MongoDB time for one request.
+
+    Reached through `current_request`; Motor copies the context into its
+    executor threads, where pymongo's command listener adds each command's
+    duration.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.mongo_seconds = 0.0
+        self.mongo_commands = 0
+        self._lock = threading.Lock()
+
+    def add_mongo(self, seconds: float):
+        with self._lock:
+            self.mongo_seconds += seconds
+            self.mongo_commands += 1
+
+    @property
+    def wall_seconds(self) -> float:
+        return time.perf_counter() - self.start
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{'/'.join(parts[-2:])}:{code.co_name}"
+
+class StackCollector:
+    """Collapsed stacks ("root;...;leaf" -> samples) for one request."""
+
+    def __init__(self):
+        self.samples = 0
+        self.stacks: Dict[str, int] = {}
+
+    def add(self, labels: List[str]):
+        self.samples += 1
+        stack = ";".join(reversed(labels))
+        if stack not in self.stacks and len(self.stacks) >= MAX_UNIQUE_STACKS:
+            stack = "[other]"
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+class StackSampler:
+    """Samples the stacks of event-loop threads from a background thread.
+
+    A request is watched through the frame of the middleware call that
+    serves it: a sampled stack that passes through that frame belongs to the
+    request. Only time spent running on the loop shows up, so time waiting
+    on MongoDB is covered by RequestStats, not here. Work a request hands to
+    another task (e.g. a single-flight read) is not attributed to it. The
+    sampler needs the GIL to take a sample, so while the loop runs Python
+    code samples come at most once per switch interval (5ms by default).
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._watched: Dict[int, tuple] = {}  # id(root frame) -> (thread id, collector)
+        self._wakeup = threading.Condition()
+        self._thread = None
+
+    def watch(self, root_frame, collector: StackCollector):
+        with self._wakeup:
+            self._watched[id(root_frame)] = (threading.get_ident(), collector)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+
+    def unwatch(self, root_frame):
+        with self._wakeup:
+            self._watched.pop(id(root_frame), None)
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._watched:
+                    self._wakeup.wait()
+                watched = dict(self._watched)
+            self._sample(watched)
+            time.sleep(self.interval)
+
+    def _sample(self, watched: Dict[int, tuple]):
+        threads = {thread_id for thread_id, _ in watched.values()}
+        frames = sys._current_frames()
+        for thread_id in threads:
+            frame = frames.get(thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                entry = watched.get(id(frame))
+                if entry is not None:
+                    entry[1].add(labels)
+                    break
+                frame = frame.f_back
+
+class ProfileTarget:
+    """Capture the next `count` requests for a route template or a user."""
+
+    def __init__(self, kind: str, value: str, count: int, ttl: float):
+        self.kind = kind
+        self.value = value
+        self.remaining = count
+        self.expires_at = time.monotonic() + ttl
+
+    def matches(self, route: str, user_id: Optional[str]) -> bool:
+        return (route if self.kind == "route" else user_id) == self.value
+
+class ProfileStore:
+    """The last `size` captured profiles, plus the armed capture targets."""
+
+    def __init__(self, size: int):
+        self.profiles = deque(maxlen=size)
+        self.targets: List[ProfileTarget] = []
+        self._ids = itertools.count(1)
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def arm(self, kind: str, value: str, count: int, ttl: float):
+        self.targets.append(ProfileTarget(kind, value, count, ttl))
+
+    @property
+    def armed(self) -> bool:
+        now = time.monotonic()
+        self.targets = [t for t in self.targets if t.remaining > 0 and t.expires_at > now]
+        return bool(self.targets)
+
+    def claim_target(self, route: str, user_id: Optional[str]) -> bool:
+        """Spend one capture from the first armed target matching the request."""
+        if not self.armed:
+            return False
+        for target in self.targets:
+            if target.matches(route, user_id):
+                target.remaining -= 1
+                return True
+        return False
+
+    def add(self, profile: dict):
+        self.profiles.append(profile)
+
+    def summaries(self) -> List[dict]:
+        return [
+            {key: value for key, value in profile.items() if key != "stacks"}
+            for profile in reversed(self.profiles)
+        ]
+
+    def get(self, profile_id: int) -> Optional[dict]:
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return profile
+        return None
+
+# Requests slower than this get their profile kept (0 disables)
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 1000))
+# Shared secret for X-Profile-Token; unset disables on-demand profiling
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+
+sampler = StackSampler(interval=float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 10)) / 1000)
+profile_store = ProfileStore(size=int(os.getenv("PROFILE_BUFFER_SIZE", 20)))
@@ -0,0 +1,45 @@
+from fastapi.responses import JSONResponse
+from models.note import NoteResponse
+from typing import Iterable, List
+import json
+
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is used instead
+    orjson = None
+
+try:
+    from pydantic import TypeAdapter
+except ImportError:  # pydantic v1
+    TypeAdapter = None
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+else:
+    DefaultResponse = JSONResponse
+
+_note_fields = getattr(NoteResponse, "model_fields", None) or NoteResponse.__fields__
+NOTE_FIELDS = list(_note_fields)
+# Fetch only what NoteResponse exposes; `_id` and bookkeeping fields such as
+# `updated_by` never leave the database.
+NOTE_PROJECTION = {"_id": 0, **{field: 1 for field in NOTE_FIELDS}}
+
+_note_list = TypeAdapter(List[NoteResponse]) if TypeAdapter is not None else None
+_note = TypeAdapter(NoteResponse) if TypeAdapter is not None else None
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":")).encode()
+
+def render_notes(notes: Iterable[dict]) -> bytes:
+    """Validate note documents once and encode them straight to JSON bytes."""
+    if _note_list is not None:
+        return _note_list.dump_json(_note_list.validate_python(list(notes)))
+    return dumps([NoteResponse(**note).dict() for note in notes])
+
+def render_ndjson(notes: Iterable[dict]) -> bytes:
+    """Encode note documents as NDJSON, one note per line."""
+    if _note is not None:
+        return b"".join(_note.dump_json(_note.validate_python(note)) + b"\n" for note in notes)
+    return b"".join(dumps(NoteResponse(**note).dict()) + b"\n" for note in notes)
@@ -0,0 +1,64 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from utils.cache import TTLCache
+from utils.metrics import singleflight_requests
+import asyncio
+
+class SingleFlight:
+    """Coalesces concurrent identical reads onto one in-flight call.
+
+    The first caller for a key runs `fn`; callers arriving while it is in
+    flight await the same task and share its result or exception. The work
+    runs as its own task, so a caller that disconnects does not cancel it
+    for the others. With `window` > 0, a result is also reused for that many
+    seconds after it completes.
+
+    Shared results must be treated as read-only. Writers call `forget` once
+    their write is done, so later reads never join a flight that started
+    before it. Not thread-safe; meant to be used from the event loop only.
+    """
+
+    def __init__(self, name: str, window: float = 0.0, maxsize: int = 10000):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._recent = TTLCache(maxsize=maxsize, ttl=window) if window > 0 else None
+        self.counts = {"run": 0, "coalesced": 0, "cached": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self._recent is not None:
+            entry = self._recent.get(key)
+            if entry is not None:
+                self._count("cached")
+                return entry[0]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self._count("run")
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self._count("coalesced")
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable):
+        self._in_flight.pop(key, None)
+        if self._recent is not None:
+            self._recent.invalidate(key)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        # Reading exception() also keeps asyncio from logging it as never
+        # retrieved when every caller has gone away
+        failed = task.cancelled() or task.exception() is not None
+        # A forgotten flight's result may predate a write; do not keep it
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+            if self._recent is not None and not failed:
+                # Wrapped so a None result can be cached too
+                self._recent.set(key, (task.result(),))
+
+    def _count(self, result: str):
+        self.counts[result] += 1
+        singleflight_requests.inc(flight=self.name, result=result)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._in_flight), **self.counts}
@@ -0,0 +1,59 @@
+from typing import Dict, List, Tuple
+import builtins
+import sys
+import time
+
+class ImportTimer:
+    """Attributes import time to top-level packages while active.
+
+    Wraps `__import__` and times only first loads. Each package is charged
+    its own (self) time, not that of the packages it pulls in, so the
+    figures add up to the total. Use around a cold import:
+
+        with ImportTimer() as timer:
+            from main import app
+        logging.info(timer.report())
+    """
+
+    def __init__(self):
+        self.self_times: Dict[str, float] = {}
+        self.total = 0.0
+        self._stack: List[float] = []
+        self._original = None
+
+    def __enter__(self):
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        builtins.__import__ = self._original
+        self.total = time.perf_counter() - self._start
+        return False
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Relative imports and cached modules cost the importer, not a package
+        if level or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            package = name.partition(".")[0]
+            self.self_times[package] = self.self_times.get(package, 0.0) + elapsed - children
+
+    def top(self, limit: int = 15) -> List[Tuple[str, float]]:
+        return sorted(self.self_times.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def report(self, limit: int = 15) -> dict:
+        """Milliseconds per package, slowest first."""
+        return {
+            "import_ms": round(self.total * 1000, 1),
+            "modules": {name: round(seconds * 1000, 1) for name, seconds in self.top(limit)},
+        }